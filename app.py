@@ -4,8 +4,20 @@ import pandas as pd
 # 関数ファイルからインポート
 from pricecards import (
     create_price_cards_from_df_24,
-    create_price_cards_from_df_18
+    create_price_cards_from_df_18,
+    copies_warnings,
+    layout_of,
+    TOB_NEEDED_COLUMNS
 )
+from labelprint import create_labels_zip, create_labels_zpl, SUPPORTED_DPI
+from delta import create_delta_price_cards, snapshot_path
+from pdfstore import get_or_create
+from memguard import create_multi_within_budget, create_within_budget
+from productmaster import import_master, join_master
+from metrics import ensure_metrics_server, run_job
+
+# PRICECARD_METRICS_PORT が設定されていれば /metrics を公開する
+ensure_metrics_server()
 
 st.title("PriceCardApp for to B")
 st.write("印刷の際は「実際のサイズ」で印刷すること")
@@ -13,28 +25,128 @@ st.write("印刷の際は「実際のサイズ」で印刷すること")
 # ラジオボタンでシートタイプを選択（デフォルトを18枚シートにする: index=0）
 sheet_option = st.radio(
     "作成するシートタイプを選択してください",
-    ["18枚シート", "24枚シート"], 
+    ["18枚シート", "24枚シート", "18枚・24枚シート(両方)", "ラベルプリンタ(PNG)", "ラベルプリンタ(ZPL)"], 
     index=0  # ← これで「18枚シート」をデフォルトに
 )
 
+# ラベルプリンタ出力のときだけ解像度を選ぶ
+label_dpi = None
+only_changed = False
+reprint_pages = None
+if sheet_option.startswith("ラベルプリンタ"):
+    label_dpi = st.radio("プリンタの解像度(dpi)", list(SUPPORTED_DPI), index=0)
+elif sheet_option != "18枚・24枚シート(両方)":
+    # 前回作成分から価格や内容が変わったカードだけを作る(両方のシートをまとめて作るときは全件)
+    only_changed = st.checkbox("前回から変更のあったカードのみ作成する", value=False)
+    # 紙詰まりなどで一部のページだけを刷り直す
+    if st.checkbox("ページを指定して再印刷する", value=False):
+        first_page = st.number_input("最初のページ", min_value=1, value=1, step=1)
+        last_page = st.number_input("最後のページ", min_value=int(first_page), value=int(first_page), step=1)
+        reprint_pages = (int(first_page), int(last_page))
+
+# キー列(id / jan)だけのアップロードを商品マスタの内容で補完する
+use_master = st.checkbox("商品マスタで補完する", value=False)
+
 uploaded_file = st.file_uploader("Excelファイルをアップロードしてください", type=["xlsx", "xls"])
 if uploaded_file is not None:
     df = pd.read_excel(uploaded_file)
+    if use_master:
+        df, unmatched = join_master(df)
+        if unmatched:
+            st.warning(f"商品マスタに無いキーが{len(unmatched)}件あります: {', '.join(unmatched[:10])}")
+    # 補完後の内容を登録する(登録は空欄でない列だけを上書きするので、キーだけの行でも既存の内容は消えない)
+    if st.button("アップロード内容を商品マスタに登録"):
+        imported = import_master(df)
+        st.success(f"{imported}行を商品マスタに登録しました。")
     st.write("アップロードされたファイル:")
     st.dataframe(df.head())
+    # 枚数の入力ミス(上限超え・数値でない)を知らせる
+    for message in copies_warnings(df, TOB_NEEDED_COLUMNS):
+        st.warning(message)
+
+    if label_dpi is not None:
+        if st.button("ラベルを生成"):
+            if sheet_option == "ラベルプリンタ(PNG)":
+                label_data, company_list, label_count = run_job(
+                    "toB", f"label_{label_dpi}dpi", create_labels_zip, df, dpi=label_dpi)
+                ext, mime = "zip", "application/zip"
+            else:
+                label_data, company_list, label_count = run_job(
+                    "toB", f"label_{label_dpi}dpi", create_labels_zpl, df, dpi=label_dpi)
+                ext, mime = "zpl", "text/plain"
+
+            if not company_list:
+                st.info("ラベルにする行がありません。")
+            else:
+                st.success(f"ラベルが{label_count}枚生成されました。")
+                st.download_button(
+                    label="ラベルをダウンロード",
+                    data=label_data,
+                    file_name=f"labels_toB_{company_list[0]}_{label_dpi}dpi.{ext}",
+                    mime=mime
+                )
+
+    elif sheet_option == "18枚・24枚シート(両方)":
+        if st.button("PDFを生成"):
+            # 1回の読み込みで両方のシートを作る。
+            # メモリ予算を超える大きさならシートごとにページ単位で分けたPDFをZIPで返す
+            results = run_job("toB", "18+24", create_multi_within_budget, df, ["toB_18", "toB_24"])
+            if not results["toB_18"][1]:
+                st.info("カードにする行がありません。")
+            else:
+                st.success("PDFが生成されました。")
+            for name, (pdf_data,company_list,layout,ext) in results.items():
+                if company_list:
+                    st.download_button(
+                        label=f"{layout}枚シートのPDFをダウンロード",
+                        data=pdf_data,
+                        file_name=f"output_toB_{company_list[0]}_{layout}.{ext}",
+                        mime="application/pdf" if ext == "pdf" else "application/zip",
+                        key=name
+                    )
+                # ZIPはディスク上のファイルを開いたまま返ってくるので、ボタンに渡したら閉じる
+                if ext == "zip":
+                    pdf_data.close()
 
-    if st.button("PDFを生成"):
+    elif st.button("PDFを生成"):
         # 選択に応じて処理を分岐
         if sheet_option == "18枚シート":
-            pdf_data,company_list,layout = create_price_cards_from_df_18(df)
+            create_func = create_price_cards_from_df_18
         else:
-            pdf_data,company_list,layout = create_price_cards_from_df_24(df)
-
-        st.success("PDFが生成されました。")
-        st.download_button(
-            label="PDFをダウンロード",
-            data=pdf_data,
-            file_name=f"output_toB_{company_list[0]}_{layout}.pdf",
-            mime="application/pdf"
-        )
+            create_func = create_price_cards_from_df_24
+
+        # メトリクス用のラベル("toB", "18" など)
+        variant, layout = layout_of(create_func)[0].split("_")
+
+        ext = "pdf"
+        if reprint_pages is not None:
+            # 指定ページに載る行だけを読み込んで、元と同じ位置に配置する
+            result = run_job(variant, layout, create_func, df, pages=reprint_pages)
+        elif only_changed:
+            result = run_job(variant, layout, create_delta_price_cards, create_func, df, snapshot_path("toB"))
+        else:
+            # 同じ内容・レイアウトで作成済みならストアから返す。
+            # メモリ予算を超える大きさならページ単位に分けたPDFをZIPで返す
+            pdf_data,company_list,layout,ext = run_job(
+                variant, layout, create_within_budget, create_func, df, in_memory=get_or_create)
+            result = pdf_data,company_list,layout
+
+        if result is None:
+            st.info("前回から変更のあったカードはありません。")
+        elif not result[1]:
+            st.info("指定したページにはカードがありません。")
+        else:
+            pdf_data,company_list,layout = result
+            suffix = f"_p{reprint_pages[0]}-{reprint_pages[1]}" if reprint_pages else ""
+            st.success("PDFが生成されました。")
+            st.download_button(
+                label="PDFをダウンロード",
+                data=pdf_data,
+                file_name=f"output_toB_{company_list[0]}_{layout}{suffix}.{ext}",
+                mime="application/pdf" if ext == "pdf" else "application/zip"
+            )
+
+        # ZIPはディスク上のファイルを開いたまま返ってくる。ボタンに渡した時点で読み込まれるので閉じる
+        if ext == "zip":
+            result[0].close()
 
@@ -0,0 +1,110 @@
+"""
+値札生成のベンチマーク。
+
+合成データでPDF生成とラベルプリンタ出力を実行し、1秒あたりの枚数を表示する。
+    python bench.py --rows 2000 --workers 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from pricecards import create_price_cards_from_df_18, create_price_cards_from_df_24
+from labelprint import create_labels_zip, create_labels_zpl
+from delta import filter_changed_rows, update_snapshot
+from memguard import profile_job
+
+
+def make_synthetic_df_tob(rows, start=0):
+    """toB用(出展者アップロード形式)の合成データを作る。start で通し番号をずらせる"""
+    indices = range(start, start + rows)
+    return pd.DataFrame({
+        "id": [f"00000000-0000-4000-8000-{i:012d}" for i in indices],
+        "出展者名": [f"出展者{i % 50:02d}株式会社" for i in indices],
+        "number": [f"A-{i:06d}" for i in indices],
+        "display_code": [f"A-{i:06d}" for i in indices],
+        "jan": [float(4900000000000 + i) for i in indices],
+        "name": [f"サンプル商品 {i}" for i in indices],
+        "price": [1000 + i % 500 for i in indices],
+        "retail_price": [1500 + i % 500 for i in indices],
+        "unit_price": [800 + i % 300 for i in indices],
+        "lot": [6 for _ in indices],
+    })
+
+
+def make_synthetic_df_toc(rows, start=0):
+    """toC用(スマレジインポート形式)の合成データを作る。start で通し番号をずらせる"""
+    indices = range(start, start + rows)
+    return pd.DataFrame({
+        "タグ": [f"タグ{i % 20:02d}" for i in indices],
+        "品番": [f"C-{i:06d}" for i in indices],
+        "商品コード": [str(4900000000000 + i) for i in indices],
+        "商品名": [f"サンプル商品 {i}" for i in indices],
+        "商品単価": [1000 + i % 500 for i in indices],
+    })
+
+
+def _measure(label, func, *args, **kwargs):
+    """func を1回実行し、所要時間と1秒あたりの枚数を表示する"""
+    start = time.perf_counter()
+    data, company_list, _ = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    count = len(company_list)
+    print(f"{label:<24} {count:>7} 枚 {elapsed:8.3f} 秒 "
+          f"{count / elapsed:9.1f} 枚/秒 {len(data) / 1024:10.1f} KiB")
+
+
+def _measure_memory(label, func, df):
+    """tracemallocで計測したピークと、メモリ予算ガードの見積もりを並べて表示する"""
+    stats = profile_job(func, df)
+    print(f"{label:<24} {stats['cards']:>7} 枚 "
+          f"ピーク {stats['traced_peak_bytes'] / 1024 / 1024:8.1f} MiB "
+          f"見積もり {stats['estimated_bytes'] / 1024 / 1024:8.1f} MiB")
+
+
+def _measure_delta(rows):
+    """スナップショットとの差分抽出にかかる時間を表示する(1%の行の価格を変更)"""
+    df = make_synthetic_df_tob(rows)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "snapshot.parquet")
+        update_snapshot(df, path)
+
+        revised = df.copy()
+        revised.loc[::100, "retail_price"] += 100
+        start = time.perf_counter()
+        changed = filter_changed_rows(revised, path)
+        elapsed = time.perf_counter() - start
+
+        # Excelを経由して int / float が入れ替わっただけの同じカタログは変更なしになること
+        retyped = df.astype({"jan": "int64", "price": "float64", "retail_price": "float64"})
+        retyped_changed = filter_changed_rows(retyped, path)
+        if len(retyped_changed):
+            raise RuntimeError(f"型が変わっただけの {len(retyped_changed)} 行が変更ありと判定されました")
+    print(f"{'差分抽出':<24} {rows:>7} 行 {elapsed:8.3f} 秒 変更 {len(changed)} 行")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="値札生成のベンチマーク")
+    parser.add_argument("--rows", type=int, default=1000, help="合成データの行数")
+    parser.add_argument("--workers", type=int, default=None, help="ラベル出力のプロセス数")
+    parser.add_argument("--delta-rows", type=int, default=100000, help="差分抽出の計測に使う行数")
+    args = parser.parse_args()
+
+    df = make_synthetic_df_tob(args.rows)
+
+    _measure("PDF 18枚シート", create_price_cards_from_df_18, df)
+    _measure("PDF 24枚シート", create_price_cards_from_df_24, df)
+    for dpi in (203, 300):
+        _measure(f"ラベル PNG/ZIP {dpi}dpi", create_labels_zip, df, dpi=dpi,
+                 max_workers=args.workers)
+        _measure(f"ラベル ZPL {dpi}dpi", create_labels_zpl, df, dpi=dpi,
+                 max_workers=args.workers)
+    _measure_memory("メモリ 18枚シート", create_price_cards_from_df_18, df)
+    _measure_memory("メモリ 24枚シート", create_price_cards_from_df_24, df)
+    _measure_delta(args.delta_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+差分印刷: 前回作成したカタログから価格や内容が変わった行だけを取り出す。
+
+前回分は id / jan / 商品コード をキーにした (キー, 内容ハッシュ) のスナップショットとして
+ローカルに保存し、新しいアップロードとはDataFrameの結合で一括比較する。
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import numpy as np
+import pandas as pd
+
+from pricecards import detect_key_column, normalize_key
+
+# 内容ハッシュに含める列(カードに印字される列)
+CONTENT_COLUMNS = [
+    # toB / 福花園
+    "id", "出展者名", "number", "display_code", "jan", "name",
+    "price", "retail_price", "unit_price", "lot",
+    # toC
+    "タグ", "品番", "商品コード", "商品名", "商品単価",
+]
+
+SNAPSHOT_DIR = ".pricecard_snapshots"
+
+# スナップショットの読み込み→結合→書き換えを直列にする(同じプロセス内のセッション用)
+_snapshot_lock = threading.Lock()
+
+
+def snapshot_path(name):
+    """用途ごと(toB / toC など)のスナップショットのパスを返す"""
+    return os.path.join(SNAPSHOT_DIR, f"{name}.parquet")
+
+
+def _normalize_content(series):
+    """
+    列の値を型に左右されない文字列にそろえる(ベクトル演算)。
+    空欄が1つあるだけで int64 の列は float64 になるので、整数値の 1500.0 は '1500' として扱う
+    (normalize_key と同じ考え方)。
+    """
+    text = series.astype("string").str.strip()
+    return text.str.replace(r"^(-?\d+)\.0+$", r"\1", regex=True).fillna("")
+
+
+def row_hashes(df):
+    """印字対象の列から行ごとの内容ハッシュ(uint64)を計算する"""
+    columns = [col for col in CONTENT_COLUMNS if col in df.columns]
+    content = df[columns].apply(_normalize_content)
+    # 列の並びが変わっても同じハッシュになるよう列名でそろえる
+    content = content[sorted(columns)]
+    return pd.util.hash_pandas_object(content, index=False).to_numpy()
+
+
+def build_snapshot(df, key_column):
+    """DataFrameから (key, hash) のスナップショットを作る。キーが重複したら後勝ち"""
+    snapshot = pd.DataFrame({
+        "key": normalize_key(df[key_column]).reset_index(drop=True),
+        "hash": row_hashes(df),
+    })
+    snapshot = snapshot.dropna(subset=["key"])
+    return snapshot.drop_duplicates(subset="key", keep="last").reset_index(drop=True)
+
+
+def load_snapshot(path):
+    """保存済みのスナップショットを読む。無ければ空のものを返す"""
+    if not os.path.exists(path):
+        return pd.DataFrame({
+            "key": pd.Series(dtype="string"),
+            "hash": pd.Series(dtype="uint64"),
+        })
+    snapshot = pd.read_parquet(path)
+    snapshot["key"] = snapshot["key"].astype("string")
+    return snapshot
+
+
+def _resolve_key_column(df, key_column):
+    if key_column is None:
+        key_column = detect_key_column(df)
+    if key_column is None or key_column not in df.columns:
+        raise ValueError("差分印刷には id / jan / 商品コード のいずれかの列が必要です")
+    return key_column
+
+
+def filter_changed_rows(df, path, key_column=None):
+    """
+    スナップショットと比べて新規または内容が変わった行だけを返す。
+    行の並び順は元のDataFrameのまま。キーが空欄の行は比較できないので常に含める。
+    """
+    key_column = _resolve_key_column(df, key_column)
+    current = pd.DataFrame({
+        "key": normalize_key(df[key_column]).reset_index(drop=True),
+        "hash": row_hashes(df),
+        "row": np.arange(len(df)),
+    })
+    previous = load_snapshot(path).rename(columns={"hash": "previous_hash"})
+    # 結合で欠損が入っても float にならないよう nullable 型にしておく
+    previous["previous_hash"] = previous["previous_hash"].astype("UInt64")
+
+    merged = current.merge(previous, on="key", how="left")
+    changed = (merged["hash"] != merged["previous_hash"]).fillna(True)
+    rows = merged.loc[changed.to_numpy(), "row"].to_numpy()
+    return df.iloc[np.sort(rows)]
+
+
+@contextmanager
+def _locked(path):
+    """
+    スナップショットの更新中は、同じプロセスの他のスレッドと他のプロセスを待たせる。
+    スレッドはモジュールのロックで、プロセスは path + ".lock" のファイルロックで止める。
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with _snapshot_lock, open(path + ".lock", "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def update_snapshot(df, path, key_column=None):
+    """今回の内容をスナップショットへ反映する(既存キーは上書き、新規キーは追加)"""
+    key_column = _resolve_key_column(df, key_column)
+    current = build_snapshot(df, key_column)
+
+    with _locked(path):
+        snapshot = pd.concat([load_snapshot(path), current], ignore_index=True)
+        snapshot = snapshot.drop_duplicates(subset="key", keep="last").reset_index(drop=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        snapshot.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+
+def create_delta_price_cards(create_func, df, path, key_column=None, **create_kwargs):
+    """
+    変更のあった行だけで create_func(例: create_price_cards_from_df_18)を実行する。
+    create_kwargs は create_func にそのまま渡す。
+    カードが作成できたときだけスナップショットを更新する。
+    変更が1件も無ければ None を返す。
+    """
+    changed_df = filter_changed_rows(df, path, key_column)
+    if changed_df.empty:
+        return None
+
+    pdf_data, company_list, layout = create_func(changed_df, **create_kwargs)
+    if not company_list:
+        return None
+    update_snapshot(df, path, key_column)
+    return pdf_data, company_list, layout
@@ -0,0 +1,286 @@
+"""
+ラベルプリンタ向けの出力(カード1枚ごとのPNG / ZPL)。
+
+A4のPDFではなく、サーマルラベルプリンタ用にカードを1枚ずつ
+指定DPIでラスタライズする。レイアウト項目(会社名・商品名・表示コード・
+価格・JAN・QRのid)はPDF版と同じものを使う。
+"""
+import io
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import qrcode
+from PIL import Image, ImageDraw, ImageFont
+
+from pricecards import (
+    TOB_NEEDED_COLUMNS, is_empty_value, iter_records, parse_copies, parse_jan_code, safe_str,
+)
+
+FONT_PATH = "NotoSansJP-Regular.ttf"
+
+# ラベル1枚のサイズ(mm)。24枚シートのカードと同じ大きさ
+LABEL_SIZE_MM = (66, 35)
+# ラベルプリンタでよく使われる解像度
+SUPPORTED_DPI = (203, 300)
+
+# 1プロセスへまとめて渡すラベル数
+CHUNK_SIZE = 16
+
+# EAN-13 のエンコード表
+_EAN_L = ["0001101", "0011001", "0010011", "0111101", "0100011",
+          "0110001", "0101111", "0111011", "0110111", "0001011"]
+_EAN_G = ["0100111", "0110011", "0011011", "0100001", "0011101",
+          "0111001", "0000101", "0010001", "0001001", "0010111"]
+_EAN_R = ["1110010", "1100110", "1101100", "1000010", "1011100",
+          "1001110", "1010000", "1000100", "1001000", "1110100"]
+_EAN_PARITY = ["LLLLLL", "LLGLGG", "LLGGLG", "LLGGGL", "LGLLGG",
+               "LGGLLG", "LGGGLL", "LGLGLG", "LGLGGL", "LGGLGL"]
+
+
+def mm_to_px(value_mm, dpi):
+    """mmをピクセル数に変換する"""
+    return int(round(value_mm * dpi / 25.4))
+
+
+def pt_to_px(value_pt, dpi):
+    """ポイントをピクセル数に変換する"""
+    return int(round(value_pt * dpi / 72.0))
+
+
+@lru_cache(maxsize=None)
+def _load_font(size_px):
+    """フォントを読み込む(プロセスごとにサイズ単位でキャッシュ)"""
+    return ImageFont.truetype(FONT_PATH, size_px)
+
+
+def extract_label_fields(record):
+    """
+    1行分のレコードからラベルに載せる項目を取り出す。
+    すべて空欄の行は None を返す。
+    """
+    if all(is_empty_value(record.get(col)) for col in TOB_NEEDED_COLUMNS):
+        return None
+
+    msrp = safe_str(record.get("retail_price", ""))
+    return {
+        "uuid": safe_str(record.get("id", "")),
+        "company": safe_str(record.get("出展者名", "")),
+        "display_code": safe_str(record.get("number", "")),
+        "product_name": safe_str(record.get("name", "")),
+        "msrp_text": "オープン" if msrp == "" or msrp == "0" else msrp,
+        "sales_price": safe_str(record.get("unit_price", "")),
+        "lot": safe_str(record.get("lot", "")),
+        "jan_code": parse_jan_code(record.get("jan")),
+        "copies": parse_copies(record),
+    }
+
+
+def iter_label_fields(df):
+    """DataFrameから空欄以外の行のラベル項目を順に返す"""
+    for record in iter_records(df):
+        fields = extract_label_fields(record)
+        if fields is not None:
+            yield fields
+
+
+def ean13_modules(jan_code):
+    """
+    JANコード(13桁)をEAN-13のモジュール列('1'=黒)に変換する。
+    チェックデジットは先頭12桁から計算し直す。
+    """
+    digits = [int(ch) for ch in jan_code[:12]]
+    checksum = sum(d * (3 if i % 2 else 1) for i, d in enumerate(digits))
+    digits.append((10 - checksum % 10) % 10)
+
+    parity = _EAN_PARITY[digits[0]]
+    left = "".join(
+        (_EAN_L if p == "L" else _EAN_G)[d] for p, d in zip(parity, digits[1:7])
+    )
+    right = "".join(_EAN_R[d] for d in digits[7:])
+    code = "".join(str(d) for d in digits)
+    return "101" + left + "01010" + right + "101", code
+
+
+def _draw_qr(img, uuid, left, top, size):
+    """QRコードを指定位置に描画する"""
+    qr = qrcode.QRCode(box_size=1, border=0)
+    qr.add_data(uuid)
+    qr.make()
+    qr_img = qr.make_image(fill_color="black", back_color="white").convert("L")
+    # ぼやけないよう最近傍で拡大する
+    qr_img = qr_img.resize((size, size), Image.NEAREST)
+    img.paste(qr_img, (left, top))
+
+
+def _draw_barcode(draw, jan_code, right, bottom, bar_height, dpi):
+    """EAN-13バーコードを右下基準で描画する"""
+    modules, code = ean13_modules(jan_code)
+    # 標準の細バー幅 0.33mm を超えない整数ピクセルにする
+    module_px = max(1, int(0.33 * dpi / 25.4))
+    font = _load_font(pt_to_px(7, dpi))
+    text_height = pt_to_px(8, dpi)
+
+    width = len(modules) * module_px
+    left = right - width
+    top = bottom - bar_height - text_height
+    for i, bit in enumerate(modules):
+        if bit == "1":
+            x0 = left + i * module_px
+            draw.rectangle([x0, top, x0 + module_px - 1, top + bar_height], fill=0)
+    draw.text((left + width // 2, top + bar_height + 1), code, font=font, fill=0, anchor="ma")
+
+
+def render_label(fields, dpi=203, label_size_mm=LABEL_SIZE_MM):
+    """
+    ラベル1枚分を1bit画像としてラスタライズする。
+    配置はPDFの24枚シートのカードに合わせている。
+    """
+    width = mm_to_px(label_size_mm[0], dpi)
+    height = mm_to_px(label_size_mm[1], dpi)
+    img = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(img)
+
+    # QRコード (左上)
+    qr_size = mm_to_px(15, dpi)
+    if fields["uuid"]:
+        _draw_qr(img, fields["uuid"], mm_to_px(2, dpi), mm_to_px(2, dpi), qr_size)
+
+    # テキスト
+    font = _load_font(pt_to_px(8, dpi))
+    line_height = pt_to_px(10, dpi)
+    text_left = mm_to_px(15 + 4, dpi)
+    text_top = mm_to_px(2, dpi)
+    lines = [
+        fields["company"][:13],
+        fields["product_name"][:13],
+        fields["display_code"][:15],
+        f"参考上代: {fields['msrp_text']}",
+        f"卸販売単価: {fields['sales_price']}, ロット: {fields['lot']}",
+    ]
+    for i, line in enumerate(lines):
+        draw.text((text_left, text_top + i * line_height), line, font=font, fill=0)
+
+    # JANコード (右下)
+    if fields["jan_code"]:
+        _draw_barcode(draw, fields["jan_code"], width - mm_to_px(2, dpi),
+                      height - mm_to_px(2, dpi), height // 3, dpi)
+
+    # サーマルプリンタ向けに2値化(ディザなし)
+    return img.point(lambda v: 255 if v > 127 else 0, mode="1")
+
+
+def label_to_png(img, dpi):
+    """ラベル画像をPNGのバイト列にする"""
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", dpi=(dpi, dpi), optimize=False)
+    return buf.getvalue()
+
+
+def label_to_zpl(img, copies=1):
+    """
+    ラベル画像をZPLの ^GFA グラフィックとして1ラベル分のコマンドにする。
+    同じラベルの複数枚は ^PQ で枚数を指定し、画像データは1回だけ送る。
+    """
+    width, height = img.size
+    bytes_per_row = (width + 7) // 8
+    # モード"1"は 0=黒 なので、ZPL(1=黒)に合わせて反転する
+    data = bytes(b ^ 0xFF for b in img.tobytes())
+    total = len(data)
+    return (
+        f"^XA^PW{width}^LL{height}^FO0,0"
+        f"^GFA,{total},{total},{bytes_per_row},{data.hex().upper()}^FS"
+        f"^PQ{copies}^XZ\n"
+    ).encode("ascii")
+
+
+def _render_label_task(args):
+    """プロセスプール用: ラベル1枚をラスタライズしてバイト列で返す"""
+    fields, dpi, label_size_mm, fmt = args
+    img = render_label(fields, dpi, label_size_mm)
+    if fmt == "zpl":
+        return label_to_zpl(img, fields["copies"])
+    return label_to_png(img, dpi)
+
+
+def _iter_rendered(tasks, max_workers):
+    """
+    ラベルを順番どおりにラスタライズして返す。
+    一度に投入するのは一定数までに抑え、全件分の画像をメモリに溜めない。
+    """
+    if max_workers == 1:
+        for task in tasks:
+            yield _render_label_task(task)
+        return
+
+    window = max_workers * CHUNK_SIZE * 4
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        batch = []
+        for task in tasks:
+            batch.append(task)
+            if len(batch) >= window:
+                yield from executor.map(_render_label_task, batch, chunksize=CHUNK_SIZE)
+                batch = []
+        if batch:
+            yield from executor.map(_render_label_task, batch, chunksize=CHUNK_SIZE)
+
+
+def _write_labels(df, fmt, dpi, label_size_mm, output, max_workers):
+    """ラベルを生成して output に書き出す共通処理"""
+    if dpi not in SUPPORTED_DPI:
+        raise ValueError(f"dpiは {SUPPORTED_DPI} のいずれかを指定してください: {dpi}")
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    company_list = []
+    copies_list = deque()
+
+    def tasks():
+        for fields in iter_label_fields(df):
+            if fields["copies"] == 0:
+                continue
+            company_list.extend([fields["company"]] * fields["copies"])
+            copies_list.append(fields["copies"])
+            yield fields, dpi, label_size_mm, fmt
+
+    # 同じ商品の複数枚はラスタライズを1回にする。
+    # ZPLは ^PQ で枚数をプリンタに指示し、PNGはファイルだけ枚数分繰り返す
+    label_count = 0
+    rendered = _iter_rendered(tasks(), max_workers)
+    if fmt == "zpl":
+        for data in rendered:
+            output.write(data)
+            label_count += copies_list.popleft()
+    else:
+        # PNGは圧縮済みなのでZIPでは無圧縮で格納する
+        with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED) as zf:
+            for data in rendered:
+                for _ in range(copies_list.popleft()):
+                    label_count += 1
+                    zf.writestr(f"label_{label_count:05d}.png", data)
+
+    return company_list, label_count
+
+
+def create_labels_zip(df, dpi=203, label_size_mm=LABEL_SIZE_MM, output=None, max_workers=None):
+    """
+    カード1枚ごとのPNGをまとめたZIPを生成する。
+    output を省略するとメモリ上に作ってバイト列を返す。
+    戻り値: (ZIPのバイト列 または output, 会社名リスト, ラベル枚数)
+    """
+    buf = io.BytesIO() if output is None else output
+    company_list, label_count = _write_labels(df, "png", dpi, label_size_mm, buf, max_workers)
+    return (buf.getvalue() if output is None else output), company_list, label_count
+
+
+def create_labels_zpl(df, dpi=203, label_size_mm=LABEL_SIZE_MM, output=None, max_workers=None):
+    """
+    カード1枚ごとに ^XA...^XZ を並べたZPLファイルを生成する。
+    output を省略するとメモリ上に作ってバイト列を返す。
+    戻り値: (ZPLのバイト列 または output, 会社名リスト, ラベル枚数)
+    """
+    buf = io.BytesIO() if output is None else output
+    company_list, label_count = _write_labels(df, "zpl", dpi, label_size_mm, buf, max_workers)
+    return (buf.getvalue() if output is None else output), company_list, label_count
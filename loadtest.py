@@ -0,0 +1,125 @@
+"""
+同時利用の負荷試験。
+
+N人のスタッフが合成スプレッドシートをアップロードして18枚/24枚シートのPDFを
+作成する状況を、生成関数に対して再現する。Streamlitはセッションごとにスレッドで
+スクリプトを実行するので、ここでも1プロセス内のスレッドで同時実行する。
+1リクエスト = Excelの読み込み(read_excel) + PDF生成。
+
+    python loadtest.py --users 8 --requests 5 --rows 300 --layout 18 --variant toB
+"""
+import argparse
+import io
+import resource
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import pricecards
+from bench import make_synthetic_df_tob, make_synthetic_df_toc
+from pdfstore import get_or_create
+
+GENERATORS = {
+    ("toB", 18): pricecards.create_price_cards_from_df_18,
+    ("toB", 24): pricecards.create_price_cards_from_df_24,
+    ("toC", 18): pricecards.create_price_cards_from_df_18_toc,
+    ("toC", 24): pricecards.create_price_cards_from_df_24_toc,
+    ("fuku", 18): pricecards.create_price_cards_from_df_18_fuku,
+    ("fuku", 24): pricecards.create_price_cards_from_df_24_fuku,
+}
+
+
+def make_upload(variant, rows, start):
+    """アップロードされるExcelファイルのバイト列を作る"""
+    if variant == "toC":
+        df = make_synthetic_df_toc(rows, start)
+    else:
+        df = make_synthetic_df_tob(rows, start)
+    buf = io.BytesIO()
+    df.to_excel(buf, index=False)
+    return buf.getvalue()
+
+
+def run_user(upload, create_func, requests, think_time, use_store, start_event):
+    """1ユーザー分: requests回アップロードとPDF作成を繰り返し、各回の所要時間を返す"""
+    latencies = []
+    errors = 0
+    start_event.wait()
+    for _ in range(requests):
+        start = time.perf_counter()
+        try:
+            df = pd.read_excel(io.BytesIO(upload))
+            if use_store:
+                get_or_create(create_func, df)
+            else:
+                create_func(df)
+        except Exception:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - start)
+        if think_time:
+            time.sleep(think_time)
+    return latencies, errors
+
+
+def peak_rss_mib():
+    """プロセスの最大常駐メモリ(MiB)。Linuxの ru_maxrss はKiB単位"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="値札生成の同時利用負荷試験")
+    parser.add_argument("--users", type=int, default=4, help="同時ユーザー数")
+    parser.add_argument("--requests", type=int, default=3, help="ユーザーごとのPDF作成回数")
+    parser.add_argument("--rows", type=int, default=200, help="1ファイルの行数")
+    parser.add_argument("--layout", type=int, choices=[18, 24], default=18)
+    parser.add_argument("--variant", choices=["toB", "toC", "fuku"], default="toB")
+    parser.add_argument("--think-time", type=float, default=0.0, help="リクエスト間の待ち(秒)")
+    parser.add_argument("--store", action="store_true", help="アプリと同じくPDFストアを経由する")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="Pythonのメモリ確保のピークも計測する(遅くなる)")
+    args = parser.parse_args()
+
+    create_func = GENERATORS[(args.variant, args.layout)]
+    # ユーザーごとに別の内容にして、ストアで重複排除されないようにする
+    uploads = [make_upload(args.variant, args.rows, user * args.rows) for user in range(args.users)]
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    start_event = threading.Event()
+    with ThreadPoolExecutor(max_workers=args.users) as executor:
+        futures = [
+            executor.submit(run_user, upload, create_func, args.requests,
+                            args.think_time, args.store, start_event)
+            for upload in uploads
+        ]
+        started = time.perf_counter()
+        start_event.set()
+        results = [future.result() for future in futures]
+        wall = time.perf_counter() - started
+
+    latencies = np.array([lat for user_latencies, _ in results for lat in user_latencies])
+    errors = sum(user_errors for _, user_errors in results)
+
+    print(f"ユーザー数 {args.users} / ユーザーごと {args.requests} 回 / "
+          f"{args.rows} 行 / {args.variant} {args.layout}枚シート")
+    print(f"成功 {len(latencies)} 件  失敗 {errors} 件  経過 {wall:.2f} 秒")
+    if len(latencies):
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(f"レイテンシ p50 {p50:.3f} 秒  p95 {p95:.3f} 秒  p99 {p99:.3f} 秒  "
+              f"最大 {latencies.max():.3f} 秒")
+        print(f"スループット {len(latencies) / wall:.2f} 件/秒  "
+              f"{len(latencies) * args.rows / wall:.1f} 枚/秒")
+    print(f"最大常駐メモリ {peak_rss_mib():.1f} MiB")
+    if args.tracemalloc:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"Pythonメモリ確保のピーク {peak / 1024 / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+メモリ予算ガード。
+
+大きなアップロードでStreamlitのプロセスがメモリ不足になると、同じホストの全セッションが落ちる。
+レンダリング前に行数とレイアウトから必要メモリを見積もり、予算を超える場合は
+ページ単位で区切った複数のPDFとしてディスクに直接書き出し、ZIPにまとめて返す。
+"""
+import os
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+import numpy as np
+
+from pricecards import LAYOUTS, RECORD_CHUNK_ROWS, card_counts, create_price_cards_multi, layout_of
+
+# 予算(MiB)。環境変数 PRICECARD_MEMORY_BUDGET_MB で変更できる
+DEFAULT_BUDGET_BYTES = int(os.environ.get("PRICECARD_MEMORY_BUDGET_MB", "256")) * 1024 * 1024
+
+# 1行分の辞書(to_dict)のおおよそのサイズ
+RECORD_OVERHEAD_BYTES = 1024
+# カード1枚分のPDFデータ(QR画像・バーコード・テキストの描画命令)のおおよそのサイズ
+PDF_BYTES_PER_CARD = 8 * 1024
+# メモリ上で作る場合のPDFデータの同時コピー数: reportlab内部, BytesIO, getvalue()
+IN_MEMORY_PDF_COPIES = 3
+
+
+def estimate_job_memory(df, create_func):
+    """create_func(df) をメモリ上で実行したときのピークメモリ(バイト)を見積もる"""
+    _, needed_columns, _ = layout_of(create_func)
+    cards = int(card_counts(df, needed_columns).sum())
+    df_bytes = int(df.memory_usage(deep=True).sum())
+    record_bytes = min(len(df), RECORD_CHUNK_ROWS) * RECORD_OVERHEAD_BYTES
+    return df_bytes + record_bytes + cards * PDF_BYTES_PER_CARD * IN_MEMORY_PDF_COPIES
+
+
+def estimate_multi_memory(df, layout_names):
+    """
+    create_price_cards_multi(df, layout_names) のピークメモリ(バイト)を見積もる。
+    全行分のレコードを共有し、各レイアウトのPDFを並行して作るので、それらを同時に持つものとする。
+    """
+    cards = sum(int(card_counts(df, LAYOUTS[name][1]).sum()) for name in layout_names)
+    df_bytes = int(df.memory_usage(deep=True).sum())
+    return df_bytes + len(df) * RECORD_OVERHEAD_BYTES + cards * PDF_BYTES_PER_CARD * IN_MEMORY_PDF_COPIES
+
+
+def _cards_per_part(df, cards_per_page, budget_bytes):
+    """ディスクに書き出す1ファイルあたりのカード枚数(ページ単位に切り下げ、最低1ページ)"""
+    available = budget_bytes - int(df.memory_usage(deep=True).sum())
+    pages = available // (cards_per_page * PDF_BYTES_PER_CARD)
+    return max(1, pages) * cards_per_page
+
+
+def create_chunked(create_func, df, budget_bytes=DEFAULT_BUDGET_BYTES, spool_dir=None, **create_kwargs):
+    """
+    空欄以外の行をページ単位で区切り、区切りごとのPDFをディスクに直接書き出してZIPにまとめる。
+    create_kwargs は create_func にそのまま渡す(例: image_dir)。
+    ZIPは spool_dir(省略時は一時ディレクトリ)に名前付きで書き、読み込み用に開き直して返す。
+    st.download_button は TemporaryFile(BufferedRandom)を受け付けないため BufferedReader にしている。
+    戻り値: (ZIPを読み込み用に開いたファイル, 会社名リスト, レイアウト)
+    """
+    name, needed_columns, cards_per_page = layout_of(create_func)
+    counts = card_counts(df, needed_columns)
+    cards_df = df[counts > 0]
+    counts = counts[counts > 0]
+    part_cards = _cards_per_part(df, cards_per_page, budget_bytes)
+    # 各行の1枚目が何枚目のカードかで区切る(枚数の多い行は区切りをまたいでも分割しない)
+    first_card = np.cumsum(counts) - counts
+    part_of_row = first_card // part_cards
+
+    company_list = []
+    layout = cards_per_page
+    fd, zip_path = tempfile.mkstemp(suffix=".zip", prefix=f"{name}_", dir=spool_dir)
+    os.close(fd)
+    try:
+        with tempfile.TemporaryDirectory(dir=spool_dir) as part_dir, \
+                zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for part, part_index in enumerate(np.unique(part_of_row), start=1):
+                part_path = os.path.join(part_dir, f"{name}_{part:03d}.pdf")
+                _, part_companies, layout = create_func(
+                    cards_df[part_of_row == part_index], output=part_path, **create_kwargs
+                )
+                company_list.extend(part_companies)
+                zf.write(part_path, arcname=os.path.basename(part_path))
+                os.remove(part_path)
+        zip_file = open(zip_path, "rb")
+    except BaseException:
+        os.remove(zip_path)
+        raise
+    # 開いたまま削除しておけば、閉じたときにディスクから消える(Windowsでは削除できないので残す)
+    try:
+        os.remove(zip_path)
+    except OSError:
+        pass
+    return zip_file, company_list, layout
+
+
+def create_within_budget(create_func, df, budget_bytes=None, spool_dir=None, in_memory=None,
+                         **create_kwargs):
+    """
+    見積もりが予算内なら通常どおりメモリ上でPDFを作り、超えるなら create_chunked に切り替える。
+    in_memory には予算内のときに使う関数(例: pdfstore.get_or_create)を指定できる。
+    in_memory は create_func と df しか受け取らないので、create_kwargs と同時には指定できない。
+    create_kwargs は create_func にそのまま渡す。
+    戻り値: (PDFのバイト列 または ZIPを開いたファイル, 会社名リスト, レイアウト, 拡張子 "pdf" / "zip")
+    """
+    if in_memory is not None and create_kwargs:
+        raise ValueError(f"in_memory と {', '.join(create_kwargs)} は同時に指定できません")
+    if budget_bytes is None:
+        budget_bytes = DEFAULT_BUDGET_BYTES
+    if estimate_job_memory(df, create_func) <= budget_bytes:
+        if in_memory is None:
+            pdf_data, company_list, layout = create_func(df, **create_kwargs)
+        else:
+            pdf_data, company_list, layout = in_memory(create_func, df)
+        return pdf_data, company_list, layout, "pdf"
+    zip_file, company_list, layout = create_chunked(create_func, df, budget_bytes, spool_dir,
+                                                    **create_kwargs)
+    return zip_file, company_list, layout, "zip"
+
+
+def create_multi_within_budget(df, layout_names, budget_bytes=None, spool_dir=None):
+    """
+    見積もりが予算内なら create_price_cards_multi でまとめて作り、
+    超えるならレイアウトごとに create_chunked で1つずつディスクに書き出す。
+    戻り値: {レイアウト名: (PDFのバイト列 または ZIPを開いたファイル, 会社名リスト, レイアウト, 拡張子)}
+    """
+    if budget_bytes is None:
+        budget_bytes = DEFAULT_BUDGET_BYTES
+    if estimate_multi_memory(df, layout_names) <= budget_bytes:
+        results = create_price_cards_multi(df, layout_names)
+        return {name: result + ("pdf",) for name, result in results.items()}
+    return {
+        name: create_chunked(LAYOUTS[name][0], df, budget_bytes, spool_dir) + ("zip",)
+        for name in layout_names
+    }
+
+
+def profile_job(create_func, df, **kwargs):
+    """
+    create_func(df) を実行し、所要時間・tracemallocで計測したピーク・見積もりを返す。
+    ベンチマークで見積もりの妥当性を確認するために使う。
+    """
+    estimate = estimate_job_memory(df, create_func)
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        data, company_list, _ = create_func(df, **kwargs)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+    return {
+        "cards": len(company_list),
+        "seconds": elapsed,
+        "traced_peak_bytes": peak,
+        "estimated_bytes": estimate,
+        "output_bytes": len(data) if isinstance(data, bytes) else None,
+    }
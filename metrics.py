@@ -0,0 +1,226 @@
+"""
+ジョブ単位の運用メトリクスと構造化ログ。
+
+PDF・ラベルの作成1回を1ジョブとして、所要時間・待ち時間・カード枚数・ページ数・出力サイズ・
+失敗をレイアウト(18/24, toB/toC/fuku)ごとに記録する。
+ジョブごとにJSON1行のログを出し、集計はPrometheusのテキスト形式でファイルに書き出す。
+環境変数 PRICECARD_METRICS_PORT を指定すると /metrics をHTTPでも公開する。
+"""
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_FILE = os.environ.get("PRICECARD_METRICS_FILE", "pricecard_metrics.prom")
+METRICS_PORT = os.environ.get("PRICECARD_METRICS_PORT")
+# 同時に実行するジョブ数の上限(指定したときだけ)。超えた分は待ち時間として記録される。
+# 未設定なら上限なしで、待ち時間は常にほぼ0になる
+MAX_CONCURRENT_JOBS = os.environ.get("PRICECARD_MAX_CONCURRENT_JOBS")
+
+DURATION_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+QUEUE_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+
+logger = logging.getLogger("pricecards.jobs")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_lock = threading.Lock()
+# メトリクスファイルの書き出し用(Streamlitのセッションは同じプロセスのスレッドなので直列にする)
+_file_lock = threading.Lock()
+_job_slots = threading.BoundedSemaphore(int(MAX_CONCURRENT_JOBS)) if MAX_CONCURRENT_JOBS else None
+_counters = {}
+_histograms = {}
+_gauges = {}
+_server = None
+
+_HELP = {
+    "pricecard_jobs_total": ("counter", "作成ジョブ数(status=ok/error)"),
+    "pricecard_cards_total": ("counter", "作成したカード枚数"),
+    "pricecard_pages_total": ("counter", "作成したページ数"),
+    "pricecard_output_bytes_total": ("counter", "出力したバイト数"),
+    "pricecard_job_duration_seconds": ("histogram", "ジョブの所要時間(待ち時間を除く)"),
+    "pricecard_queue_wait_seconds": ("histogram", "ジョブが実行枠を待った時間(PRICECARD_MAX_CONCURRENT_JOBS 指定時)"),
+    "pricecard_last_job_cards_per_second": ("gauge", "直近のジョブの1秒あたりカード枚数"),
+}
+
+
+def _inc(name, labels, value=1):
+    key = (name, labels)
+    _counters[key] = _counters.get(key, 0) + value
+
+
+def _observe(name, labels, value, buckets):
+    key = (name, labels)
+    hist = _histograms.get(key)
+    if hist is None:
+        hist = _histograms[key] = {"buckets": buckets, "counts": [0] * len(buckets), "sum": 0.0, "count": 0}
+    for i, bound in enumerate(buckets):
+        if value <= bound:
+            hist["counts"][i] += 1
+    hist["sum"] += value
+    hist["count"] += 1
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+def render_metrics():
+    """現在の集計をPrometheusのテキスト形式で返す"""
+    lines = []
+    with _lock:
+        for name, (kind, help_text) in _HELP.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (key_name, labels), value in sorted(_counters.items()):
+                    if key_name == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+            elif kind == "gauge":
+                for (key_name, labels), value in sorted(_gauges.items()):
+                    if key_name == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+            else:
+                for (key_name, labels), hist in sorted(_histograms.items(), key=lambda item: item[0]):
+                    if key_name != name:
+                        continue
+                    for bound, count in zip(hist["buckets"], hist["counts"]):
+                        lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {hist['count']}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {hist['sum']}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {hist['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics_file(path=METRICS_FILE):
+    """集計をファイルに書き出す(node_exporter の textfile collector などで読める)"""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with _file_lock:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(render_metrics())
+        os.replace(tmp_path, path)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def ensure_metrics_server(port=METRICS_PORT):
+    """port が指定されていれば /metrics を公開するHTTPサーバーを1度だけ起動する"""
+    global _server
+    if not port:
+        return
+    with _lock:
+        if _server is not None:
+            return
+        _server = ThreadingHTTPServer(("127.0.0.1", int(port)), _MetricsHandler)
+    threading.Thread(target=_server.serve_forever, daemon=True).start()
+
+
+def _output_size(data):
+    """出力(バイト列・ファイル・パス)のサイズ"""
+    if isinstance(data, (bytes, bytearray)):
+        return len(data)
+    if isinstance(data, str):
+        return os.path.getsize(data)
+    if hasattr(data, "fileno"):
+        return os.fstat(data.fileno()).st_size
+    return 0
+
+
+def _job_stats(result, layout):
+    """生成関数の戻り値から (カード枚数, ページ数, 出力バイト数) を求める"""
+    if result is None:
+        return 0, 0, 0
+    if isinstance(result, dict):
+        # create_price_cards_multi: {レイアウト名: (出力, 会社名リスト, レイアウト)}
+        stats = [_job_stats(item, item[2]) for item in result.values()]
+        return tuple(sum(values) for values in zip(*stats)) if stats else (0, 0, 0)
+    cards = len(result[1])
+    cards_per_page = int(layout) if str(layout).isdigit() else 1
+    return cards, math.ceil(cards / cards_per_page), _output_size(result[0])
+
+
+def run_job(variant, layout, func, *args, **kwargs):
+    """
+    func(*args, **kwargs) を1ジョブとして実行し、メトリクスとJSONログを記録する。
+    func は (出力, 会社名リスト, ...) を返す生成関数(差分印刷で対象が無いときの None も可)か、
+    複数レイアウトをまとめて作る create_price_cards_multi。
+    layout はカード枚数/ページ("18" / "24")、ラベル出力なら "label" などの名前。
+    """
+    job_id = uuid.uuid4().hex
+    labels = (("variant", variant), ("layout", str(layout)))
+    queued = time.perf_counter()
+    with _job_slots if _job_slots is not None else nullcontext():
+        started = time.perf_counter()
+        queue_wait = started - queued
+        error = None
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            error = e
+            result = None
+        duration = time.perf_counter() - started
+
+    cards, pages, output_bytes = _job_stats(result, layout)
+    status = "error" if error is not None else "ok"
+
+    with _lock:
+        _inc("pricecard_jobs_total", labels + (("status", status),))
+        _observe("pricecard_job_duration_seconds", labels, duration, DURATION_BUCKETS)
+        _observe("pricecard_queue_wait_seconds", labels, queue_wait, QUEUE_WAIT_BUCKETS)
+        if error is None:
+            _inc("pricecard_cards_total", labels, cards)
+            _inc("pricecard_pages_total", labels, pages)
+            _inc("pricecard_output_bytes_total", labels, output_bytes)
+            _gauges[("pricecard_last_job_cards_per_second", labels)] = (
+                round(cards / duration, 3) if duration > 0 else 0
+            )
+
+    logger.info(json.dumps({
+        "event": "pricecard_job",
+        "job_id": job_id,
+        "variant": variant,
+        "layout": str(layout),
+        "status": status,
+        "cards": cards,
+        "pages": pages,
+        "duration_seconds": round(duration, 4),
+        "queue_wait_seconds": round(queue_wait, 4),
+        "cards_per_second": round(cards / duration, 2) if duration > 0 else None,
+        "output_bytes": output_bytes,
+        "error": repr(error) if error is not None else None,
+    }, ensure_ascii=False))
+
+    try:
+        write_metrics_file()
+    except OSError:
+        logger.exception("メトリクスファイルを書き出せませんでした")
+
+    if error is not None:
+        raise error
+    return result
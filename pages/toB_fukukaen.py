@@ -2,7 +2,13 @@ import streamlit as st
 import pandas as pd
 
 # 関数ファイルからインポート
-from pricecards import create_price_cards_from_df_18_fuku
+from pricecards import create_price_cards_from_df_18_fuku, copies_warnings, TOB_NEEDED_COLUMNS
+from pdfstore import get_or_create
+from memguard import create_within_budget
+from metrics import ensure_metrics_server, run_job
+
+# PRICECARD_METRICS_PORT が設定されていれば /metrics を公開する
+ensure_metrics_server()
 
 st.title("PriceCardApp for to B for FUKUKAEN")
 st.write("印刷の際は「実際のサイズ」で印刷すること")
@@ -14,23 +20,48 @@ sheet_option = st.radio(
     index=0  # ← これで「18枚シート」をデフォルトに
 )
 
+# 紙詰まりなどで一部のページだけを刷り直す
+reprint_pages = None
+if st.checkbox("ページを指定して再印刷する", value=False):
+    first_page = st.number_input("最初のページ", min_value=1, value=1, step=1)
+    last_page = st.number_input("最後のページ", min_value=int(first_page), value=int(first_page), step=1)
+    reprint_pages = (int(first_page), int(last_page))
+
 uploaded_file = st.file_uploader("Excelファイルをアップロードしてください", type=["xlsx", "xls"])
 if uploaded_file is not None:
     df = pd.read_excel(uploaded_file)
     st.write("アップロードされたファイル:")
     st.dataframe(df.head())
+    # 枚数の入力ミス(上限超え・数値でない)を知らせる
+    for message in copies_warnings(df, TOB_NEEDED_COLUMNS):
+        st.warning(message)
 
     if st.button("PDFを生成"):
         # 選択に応じて処理を分岐
-        if sheet_option == "18枚シート":
-            pdf_data,company_list,layout = create_price_cards_from_df_18_fuku(df)
+        if reprint_pages is not None:
+            # 指定ページに載る行だけを読み込んで、元と同じ位置に配置する
+            pdf_data,company_list,layout = run_job(
+                "fuku", "18", create_price_cards_from_df_18_fuku, df, pages=reprint_pages)
+            ext = "pdf"
+        elif sheet_option == "18枚シート":
+            pdf_data,company_list,layout,ext = run_job(
+                "fuku", "18", create_within_budget,
+                create_price_cards_from_df_18_fuku, df, in_memory=get_or_create)
         
 
-        st.success("PDFが生成されました。")
-        st.download_button(
-            label="PDFをダウンロード",
-            data=pdf_data,
-            file_name=f"output_toB_{company_list[0]}_{layout}.pdf",
-            mime="application/pdf"
-        )
+        if not company_list:
+            st.info("指定したページにはカードがありません。")
+        else:
+            suffix = f"_p{reprint_pages[0]}-{reprint_pages[1]}" if reprint_pages else ""
+            st.success("PDFが生成されました。")
+            st.download_button(
+                label="PDFをダウンロード",
+                data=pdf_data,
+                file_name=f"output_toB_{company_list[0]}_{layout}{suffix}.{ext}",
+                mime="application/pdf" if ext == "pdf" else "application/zip"
+            )
+
+        # ZIPはディスク上のファイルを開いたまま返ってくる。ボタンに渡した時点で読み込まれるので閉じる
+        if ext == "zip":
+            pdf_data.close()
 
@@ -2,7 +2,17 @@ import streamlit as st
 import pandas as pd
 
 # 関数ファイルからインポート
-from pricecards import (create_price_cards_from_df_18_toc,create_price_cards_from_df_24_toc)
+from pricecards import (create_price_cards_from_df_18_toc,create_price_cards_from_df_24_toc,layout_of,
+                        copies_warnings,TOC_NEEDED_COLUMNS)
+from delta import create_delta_price_cards, snapshot_path
+from pdfstore import get_or_create
+from memguard import create_within_budget
+from productmaster import import_master, join_master
+from metrics import ensure_metrics_server, run_job
+from thumbcache import IMAGE_DIR, resolve_image_dir
+
+# PRICECARD_METRICS_PORT が設定されていれば /metrics を公開する
+ensure_metrics_server()
 
 st.title("PriceCardApp for to C")
 st.write("印刷の際は「実際のサイズ」で印刷すること")
@@ -17,25 +27,93 @@ sheet_option = st.radio(
     index=0  # ← これで「18枚シート」をデフォルトに
 )
 
+# 前回作成分から価格や内容が変わったカードだけを作る
+only_changed = st.checkbox("前回から変更のあったカードのみ作成する", value=False)
+
+# 紙詰まりなどで一部のページだけを刷り直す
+reprint_pages = None
+if st.checkbox("ページを指定して再印刷する", value=False):
+    first_page = st.number_input("最初のページ", min_value=1, value=1, step=1)
+    last_page = st.number_input("最後のページ", min_value=int(first_page), value=int(first_page), step=1)
+    reprint_pages = (int(first_page), int(last_page))
+
+
+# キー列(商品コード)だけのアップロードを商品マスタの内容で補完する
+use_master = st.checkbox("商品マスタで補完する", value=False)
+
+# QRコードの位置に商品画像(品番またはJANと同じファイル名)を表示する
+use_photos = st.checkbox("商品画像を表示する", value=False)
+image_dir = None
+if use_photos:
+    # 画像フォルダは IMAGE_DIR の中に限る(空欄なら IMAGE_DIR そのもの)
+    image_subdir = st.text_input(f"商品画像フォルダ({IMAGE_DIR} からの相対パス)", value="")
+    try:
+        image_dir = resolve_image_dir(image_subdir)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
 
 uploaded_file = st.file_uploader("Excelファイル（スマレジインポートデータ）をアップロードしてください", type=["xlsx", "xls"])
 if uploaded_file is not None:
     df = pd.read_excel(uploaded_file)
+    if use_master:
+        df, unmatched = join_master(df)
+        if unmatched:
+            st.warning(f"商品マスタに無いキーが{len(unmatched)}件あります: {', '.join(unmatched[:10])}")
+    # 補完後の内容を登録する(登録は空欄でない列だけを上書きするので、キーだけの行でも既存の内容は消えない)
+    if st.button("アップロード内容を商品マスタに登録"):
+        imported = import_master(df)
+        st.success(f"{imported}行を商品マスタに登録しました。")
     st.write("アップロードされたファイル:")
     st.dataframe(df.head())
+    # 枚数の入力ミス(上限超え・数値でない)を知らせる
+    for message in copies_warnings(df, TOC_NEEDED_COLUMNS):
+        st.warning(message)
     if st.button("PDFを生成"):
             # 選択に応じて処理を分岐
             if sheet_option == "18枚シート":
-                pdf_data,company_list,layout = create_price_cards_from_df_18_toc(df)
+                create_func = create_price_cards_from_df_18_toc
             else:
-                pdf_data,company_list,layout = create_price_cards_from_df_24_toc(df)
-
-            st.success("PDFが生成されました。")
-            st.download_button(
-                label="PDFをダウンロード",
-                data=pdf_data,
-                file_name=f"output_toC_{company_list[0]}_{layout}.pdf",
-                mime="application/pdf"
-            )
+                create_func = create_price_cards_from_df_24_toc
+
+            # メトリクス用のラベル("toC", "18" など)
+            variant, layout = layout_of(create_func)[0].split("_")
+
+            ext = "pdf"
+            if reprint_pages is not None:
+                # 指定ページに載る行だけを読み込んで、元と同じ位置に配置する
+                result = run_job(variant, layout, create_func, df, pages=reprint_pages, image_dir=image_dir)
+            elif only_changed:
+                result = run_job(variant, layout, create_delta_price_cards, create_func, df, snapshot_path("toC"),
+                                 image_dir=image_dir)
+            else:
+                # 同じ内容・レイアウトで作成済みならストアから返す(画像はストアのキーに含まれないので対象外)。
+                # メモリ予算を超える大きさならページ単位に分けたPDFをZIPで返す
+                if image_dir:
+                    pdf_data,company_list,layout,ext = run_job(
+                        variant, layout, create_within_budget, create_func, df, image_dir=image_dir)
+                else:
+                    pdf_data,company_list,layout,ext = run_job(
+                        variant, layout, create_within_budget, create_func, df, in_memory=get_or_create)
+                result = pdf_data,company_list,layout
+
+            if result is None:
+                st.info("前回から変更のあったカードはありません。")
+            elif not result[1]:
+                st.info("指定したページにはカードがありません。")
+            else:
+                pdf_data,company_list,layout = result
+                suffix = f"_p{reprint_pages[0]}-{reprint_pages[1]}" if reprint_pages else ""
+                st.success("PDFが生成されました。")
+                st.download_button(
+                    label="PDFをダウンロード",
+                    data=pdf_data,
+                    file_name=f"output_toC_{company_list[0]}_{layout}{suffix}.{ext}",
+                    mime="application/pdf" if ext == "pdf" else "application/zip"
+                )
+
+            # ZIPはディスク上のファイルを開いたまま返ってくる。ボタンに渡した時点で読み込まれるので閉じる
+            if ext == "zip":
+                result[0].close()
 
 
@@ -0,0 +1,129 @@
+"""
+作成済みPDFのローカルストア(内容アドレス方式)。
+
+(正規化した入力のハッシュ, レイアウト, コードのバージョン) をキーにPDFを保存し、
+同じ依頼にはディスクから即座に返す。PDFは invariant モードで作るので
+同じ入力からは常に同じバイト列になる。
+合計サイズが上限を超えたら最後に使われたのが古いものから削除する。
+"""
+import hashlib
+import json
+import os
+import threading
+from functools import lru_cache
+
+import pandas as pd
+
+import pricecards
+
+STORE_DIR = ".pricecard_store"
+MAX_STORE_BYTES = 500 * 1024 * 1024
+
+
+@lru_cache(maxsize=None)
+def code_version():
+    """レイアウトを描画するコード(pricecards.py)のハッシュ"""
+    with open(pricecards.__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def input_digest(df):
+    """
+    DataFrameの内容のハッシュ。
+    値は文字列に正規化するので、読み込み時の型の違い(int / float / object)には左右されにくい。
+    """
+    normalized = df.astype("string").fillna("")
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(col) for col in df.columns], ensure_ascii=False).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(normalized, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def store_key(df, layout_name):
+    """ストアのキー: 入力・レイアウト・コードのバージョンを合わせたハッシュ"""
+    source = f"{input_digest(df)}:{layout_name}:{code_version()}"
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def _entry_paths(store_dir, key):
+    base = os.path.join(store_dir, key[:2], key)
+    return base + ".pdf", base + ".json"
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load(store_dir, key):
+    """
+    ストアから (PDF, 会社名リスト, レイアウト) を読む。無ければNone。
+    最終アクセス時刻として mtime を更新する(atime はマウント設定で更新されないことがあるため)。
+    """
+    pdf_path, meta_path = _entry_paths(store_dir, key)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(pdf_path, "rb") as f:
+            pdf_data = f.read()
+        os.utime(pdf_path)
+        os.utime(meta_path)
+    except FileNotFoundError:
+        return None
+    return pdf_data, meta["company_list"], meta["layout"]
+
+
+def save(store_dir, key, pdf_data, company_list, layout):
+    """PDFとメタデータをストアに書き込む"""
+    pdf_path, meta_path = _entry_paths(store_dir, key)
+    os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+    _write_atomic(pdf_path, pdf_data)
+    meta = {"company_list": company_list, "layout": layout}
+    _write_atomic(meta_path, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+
+
+def evict(store_dir=STORE_DIR, max_bytes=MAX_STORE_BYTES):
+    """合計サイズが max_bytes 以下になるまで、最終アクセスが古いエントリから削除する"""
+    entries = {}
+    total = 0
+    for root, _, files in os.walk(store_dir):
+        for name in files:
+            if not name.endswith((".pdf", ".json")):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            key = os.path.splitext(name)[0]
+            size, last_access = entries.get(key, (0, 0.0))
+            entries[key] = (size + stat.st_size, max(last_access, stat.st_mtime))
+            total += stat.st_size
+
+    for key, (size, _) in sorted(entries.items(), key=lambda item: item[1][1]):
+        if total <= max_bytes:
+            break
+        for path in _entry_paths(store_dir, key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        total -= size
+
+
+def get_or_create(create_func, df, store_dir=STORE_DIR, max_bytes=MAX_STORE_BYTES):
+    """
+    ストアにあればそれを返し、無ければ create_func(df, invariant=True) で作って保存する。
+    戻り値は create_func と同じ (PDF, 会社名リスト, レイアウト)。
+    """
+    key = store_key(df, create_func.__name__)
+    cached = load(store_dir, key)
+    if cached is not None:
+        return cached
+
+    pdf_data, company_list, layout = create_func(df, invariant=True)
+    save(store_dir, key, pdf_data, company_list, layout)
+    evict(store_dir, max_bytes)
+    return pdf_data, company_list, layout
@@ -1,6 +1,7 @@
 import qrcode
 import pandas as pd
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import mm
@@ -11,6 +12,9 @@ from reportlab.lib import utils
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 import math
+import unicodedata
+from thumbcache import index_image_dir, product_photo
+import numpy as np
 
 
 
@@ -37,8 +41,217 @@ def safe_str(val):
     return sval
 
 
+def new_canvas(pdf_buffer, invariant=False):
+    """
+    A4のCanvasを作る。
+    invariant=True のときは作成日時や文書IDを固定し、同じ入力から毎回同じバイト列のPDFを出力する。
+    """
+    return canvas.Canvas(pdf_buffer, pagesize=A4, invariant=1 if invariant else None)
+
+
+# すべて空欄ならカードを作らない判定に使う列
+TOB_NEEDED_COLUMNS = ["id", "出展者名", "display_code", "jan", "name", "price", "retail_price"]
+TOC_NEEDED_COLUMNS = ["タグ", "品番", "商品コード", "商品名", "商品単価"]
+
+# to_dict を一度に行う行数
+RECORD_CHUNK_ROWS = 1000
+
+def iter_records(df, chunk_rows=RECORD_CHUNK_ROWS):
+    """
+    行を辞書として順に返す。
+    to_dict は chunk_rows 行ずつ行い、全行分の辞書を同時にメモリに持たないようにする。
+    """
+    for start in range(0, len(df), chunk_rows):
+        yield from df.iloc[start:start + chunk_rows].to_dict(orient="records")
+
+def non_empty_mask(df, needed_columns):
+    """is_empty_value と同じ基準で、needed_columns のどれかが空欄でない行をベクトル演算で判定する"""
+    mask = np.zeros(len(df), dtype=bool)
+    for col in needed_columns:
+        if col not in df.columns:
+            continue
+        values = df[col]
+        filled = values.notna()
+        if not pd.api.types.is_numeric_dtype(values):
+            # 空白だけの文字列も空欄扱い
+            blank = values.astype("string").str.strip().eq("").fillna(False)
+            filled &= ~blank
+        mask |= filled.to_numpy()
+    return mask
+
+# 1行あたりの印刷枚数を指定する列
+COPIES_COLUMNS = ["copies", "枚数"]
+# 1行あたりの印刷枚数の上限。100000 のような入力ミスで大量のカードを作らないようにする
+MAX_COPIES = 100
+
+def _copies_from_numbers(numbers):
+    """
+    数値化した枚数(float)を印刷枚数にする。parse_copies と card_counts の共通の規則。
+    数値でない・有限でないときは1枚、小数は切り捨て、負の数は0枚、MAX_COPIES を超える数は MAX_COPIES 枚。
+    """
+    numbers = np.asarray(numbers, dtype=float)
+    valid = np.isfinite(numbers)
+    copies = np.clip(np.trunc(np.where(valid, numbers, 1)), 0, MAX_COPIES)
+    return np.where(valid, copies, 1).astype(np.int64)
+
+def _copies_numbers(df):
+    """
+    copies / 枚数 列を行ごとに数値化する(ベクトル演算)。
+    戻り値: (数値の配列(列が無い・空欄・数値でない行はNaN), 数値として読めなかった行のマスク)
+    """
+    numbers = np.full(len(df), np.nan)
+    invalid = np.zeros(len(df), dtype=bool)
+    resolved = np.zeros(len(df), dtype=bool)
+    for col in COPIES_COLUMNS:
+        if col not in df.columns:
+            continue
+        filled = non_empty_mask(df, [col]) & ~resolved
+        text = df[col].astype("string").str.normalize("NFKC").str.strip()
+        numeric = pd.to_numeric(text, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+        numbers = np.where(filled, numeric, numbers)
+        invalid |= filled & ~np.isfinite(numeric)
+        resolved |= filled
+    return numbers, invalid
+
+def parse_copies(record):
+    """
+    copies / 枚数 列から印刷枚数を取り出す。列が無い・空欄・数値でないときは1枚。
+    全角数字('３')も読めるよう NFKC で正規化してから card_counts と同じ pd.to_numeric で数値化する。
+    """
+    for col in COPIES_COLUMNS:
+        val = record.get(col)
+        if is_empty_value(val):
+            continue
+        number = pd.to_numeric(unicodedata.normalize("NFKC", str(val)).strip(), errors="coerce")
+        return int(_copies_from_numbers(number))
+    return 1
+
+def card_counts(df, needed_columns):
+    """
+    行ごとのカード枚数を parse_copies と同じ基準でベクトル演算で求める。
+    (NFKC で正規化した文字列を pd.to_numeric で数値化し、_copies_from_numbers で枚数にする)
+    すべて空欄の行は0枚。
+    """
+    numbers, _ = _copies_numbers(df)
+    return np.where(non_empty_mask(df, needed_columns), _copies_from_numbers(numbers), 0)
 
-def create_price_cards_from_df_24(df):
+def copies_warnings(df, needed_columns):
+    """
+    枚数の列に上限 MAX_COPIES を超える行や数値でない行があれば、画面に出す警告文のリストを返す。
+    行はExcelの行番号(見出しが1行目)で示す。
+    """
+    numbers, invalid = _copies_numbers(df)
+    printable = non_empty_mask(df, needed_columns)
+    finite = np.isfinite(numbers)
+    clipped = printable & finite & (np.trunc(np.where(finite, numbers, 0)) > MAX_COPIES)
+    invalid &= printable
+
+    def excel_rows(mask):
+        rows = [str(row + 2) for row in np.flatnonzero(mask)[:10]]
+        return ", ".join(rows) + (" ほか" if mask.sum() > 10 else "")
+
+    messages = []
+    if clipped.any():
+        messages.append(f"枚数が上限の{MAX_COPIES}枚を超える行が{int(clipped.sum())}件あります。"
+                        f"{MAX_COPIES}枚で作成します(行: {excel_rows(clipped)})")
+    if invalid.any():
+        messages.append(f"枚数が数値でない行が{int(invalid.sum())}件あります。"
+                        f"1枚で作成します(行: {excel_rows(invalid)})")
+    return messages
+
+def page_rows(df, needed_columns, cards_per_page, pages):
+    """
+    pages=(最初のページ, 最後のページ)(1始まり、両端を含む)に載るカードがある行の位置と、
+    そのうち最初の行の1枚目が文書全体で何枚目か(0始まり)を返す。
+    行ごとのカード枚数の累積和で求めるので、前の行を1行ずつ処理しなくてよい。
+    """
+    first_page, last_page = pages
+    if first_page < 1 or last_page < first_page:
+        raise ValueError(f"ページの範囲が正しくありません: {first_page}〜{last_page}")
+
+    counts = card_counts(df, needed_columns)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    first = (first_page - 1) * cards_per_page
+    last = last_page * cards_per_page
+    rows = np.flatnonzero((counts > 0) & (starts < last) & (ends > first))
+    first_card = int(starts[rows[0]]) if len(rows) else first
+    return rows, first_card
+
+def page_records(df, records, needed_columns, cards_per_page, pages=None):
+    """
+    生成関数で使うレコードと、その最初のカードの通し番号(0始まり)を返す。
+    pages を指定したときは page_rows で求めた行だけに絞る。
+    """
+    if pages is None:
+        return (iter_records(df) if records is None else records), 0
+    rows, first_card = page_rows(df, needed_columns, cards_per_page, pages)
+    if records is None:
+        return iter_records(df.iloc[rows]), first_card
+    return [records[i] for i in rows], first_card
+
+def iter_card_positions(records, needed_columns, cards_per_page, cols, first_card=0, pages=None):
+    """
+    空欄の行を除いたレコードごとに (record, positions) を返す。
+    positions はそのレコードのカードを置く (col_idx, row_idx, new_page) を枚数分だけ順に返す。
+    枚数分のレコードは作らず配置だけを進めるので、文字列化やQR・バーコードの作成は1SKUにつき1回で済む。
+    records が文書の途中から始まるときは first_card にその通し番号を渡す。
+    pages を指定すると範囲外のカードは飛ばし、範囲内のカードは元の文書と同じ位置に置く。
+    """
+    card_count = first_card
+    placed = 0
+    if pages is None:
+        first, last = 0, None
+    else:
+        first, last = (pages[0] - 1) * cards_per_page, pages[1] * cards_per_page
+
+    def positions(copies):
+        nonlocal card_count, placed
+        for _ in range(copies):
+            if card_count >= first and (last is None or card_count < last):
+                card_index_on_page = card_count % cards_per_page
+                new_page = card_index_on_page == 0 and placed != 0
+                yield card_index_on_page % cols, card_index_on_page // cols, new_page
+                placed += 1
+            card_count += 1
+
+    for record in records:
+        if all(is_empty_value(record.get(col)) for col in needed_columns):
+            continue
+        yield record, positions(parse_copies(record))
+
+def finish_output(pdf_buffer, output):
+    """output 未指定ならPDFのバイト列を、指定されていれば output をそのまま返す"""
+    if output is None:
+        return pdf_buffer.getvalue()
+    return output
+
+
+# 商品を一意に識別できる列(優先順)
+KEY_COLUMNS = ["id", "jan", "商品コード"]
+
+def detect_key_column(df):
+    """KEY_COLUMNS のうちDataFrameに含まれる最初の列名を返す。無ければNone"""
+    for col in KEY_COLUMNS:
+        if col in df.columns:
+            return col
+    return None
+
+def normalize_key(series):
+    """
+    キー列を比較可能な文字列に揃える(ベクトル演算)。
+    Excel由来の 4901234567890.0 と '4901234567890' を同じキーとして扱い、空欄は<NA>にする。
+    """
+    if pd.api.types.is_float_dtype(series):
+        return series.round().astype("Int64").astype("string")
+    keys = series.astype("string").str.strip()
+    keys = keys.str.replace(r"\.0$", "", regex=True)
+    return keys.mask(keys.isin(["", "nan", "NaN"]))
+
+
+
+def create_price_cards_from_df_24(df, invariant=False, output=None, records=None, symbols=None,
+                                  pages=None):
     """
     24枚シート(8行×3列)用のPDFを生成する例。
     """
@@ -54,31 +267,19 @@ def create_price_cards_from_df_24(df):
     rows = 8
     cards_per_page = cols * rows
 
-    pdf_buffer = BytesIO()
-    c = canvas.Canvas(pdf_buffer, pagesize=A4)
+    pdf_buffer = BytesIO() if output is None else output
+    c = new_canvas(pdf_buffer, invariant)
     c.setFont("Meiryo", 8)
 
-    needed_columns = ["id", "出展者名", "display_code", "jan", "name", "price", "retail_price"]
-    records = df.to_dict(orient="records")
+    needed_columns = TOB_NEEDED_COLUMNS
+    # records を渡されたときは読み込み済みのものを使う(複数レイアウトの同時作成)。
+    # pages を指定したときはそのページに載る行だけを読み込む(再印刷)
+    records, first_card = page_records(df, records, needed_columns, cards_per_page, pages)
 
-    card_count = 0
     company_list = []  # ★ 会社名を格納するリストを用意
 
-    for i, record in enumerate(records):
-        if all(is_empty_value(record.get(col)) for col in needed_columns):
-            continue
-
-        card_index_on_page = card_count % cards_per_page
-        col_idx = card_index_on_page % cols
-        row_idx = card_index_on_page // cols
-
-        if card_index_on_page == 0 and card_count != 0:
-            c.showPage()  # 新しいページを作成
-            c.setFont("Meiryo", 8)
-
-        x = left_margin + col_idx * card_width
-        y = page_height - top_margin - (row_idx + 1) * card_height
-
+    for record, positions in iter_card_positions(records, needed_columns, cards_per_page, cols,
+                                                 first_card, pages):
         uuid = safe_str(record.get('id', ''))
         company = safe_str(record.get('出展者名', ''))
         display_code = safe_str(record.get('number', ''))
@@ -100,35 +301,9 @@ def create_price_cards_from_df_24(df):
         sales_price = safe_str(record.get('unit_price', ''))  # 卸単価
         lot = safe_str(record.get('lot', ''))  # 販売ロット
 
-        company_list.append(company)  # ★ 会社名リストに追加
-
-        # QRコード
-        if uuid:
-            qr = qrcode.QRCode(box_size=2, border=0)
-            qr.add_data(uuid)
-            qr.make()
-            img_qr = qr.make_image(fill_color="black", back_color="white")
-            qr_buf = BytesIO()
-            img_qr.save(qr_buf, format='PNG')
-            qr_buf.seek(0)
-            qr_img = utils.ImageReader(qr_buf)
-
-            qr_img_width = 15 * mm
-            qr_img_height = 15 * mm
-            c.drawImage(qr_img, x + 2 * mm, y + card_height - qr_img_height - 2 * mm,
-                        width=qr_img_width, height=qr_img_height, preserveAspectRatio=True, mask='auto')
-
-        # テキスト
-        text_left = x + (15 * mm) + 4 * mm
-        text_top = y + card_height - 3.5 * mm
-
-        c.drawString(text_left, text_top, company[:13])
-        c.drawString(text_left, text_top - 10, product_name[:13])
-        c.drawString(text_left, text_top - 20, f"{display_code[:15]}")
-        c.drawString(text_left, text_top - 30, f"参考上代: {msrp_text}")
-        c.drawString(text_left, text_top - 40, f"卸販売単価: {sales_price}, ロット: {lot}")
-
-        # JANコードの処理
+        # QRコードとバーコードはSKUごとに1回だけ作り、枚数分のカードで使い回す
+        qr_img = make_qr_image(uuid, symbols) if uuid else None
+        barcode_drawing = None
         if jan_code is not None:  # jan_codeがNoneでない場合のみ処理を行う
             jan_code_str = str(jan_code)
 
@@ -137,28 +312,43 @@ def create_price_cards_from_df_24(df):
             elif len(jan_code_str) > 13:
                 jan_code_str = jan_code_str[:13]
 
-            barcode = eanbc.Ean13BarcodeWidget(jan_code_str)
-            barcode.barHeight = card_height / 3.0
-            x1, y1, x2, y2 = barcode.getBounds()
-            barcode_width = x2 - x1
-            barcode_height = y2 - y1
+            barcode_drawing = make_barcode_drawing(jan_code_str, card_height)
 
-            barcode_x = x + card_width - barcode_width - 2 * mm
-            barcode_y = y + 2 * mm
+        for col_idx, row_idx, new_page in positions:
+            if new_page:
+                c.showPage()  # 新しいページを作成
+                c.setFont("Meiryo", 8)
 
-            barcode_drawing = Drawing(barcode_width, barcode_height)
-            barcode_drawing.add(barcode)
-            renderPDF.draw(barcode_drawing, c, barcode_x, barcode_y)
+            x = left_margin + col_idx * card_width
+            y = page_height - top_margin - (row_idx + 1) * card_height
 
-        card_count += 1  # カード生成ごとにインクリメント
+            company_list.append(company)  # ★ 会社名リストに追加
+
+            # QRコード
+            if qr_img is not None:
+                draw_qr_image(c, qr_img, x, y, card_height)
+
+            # テキスト
+            text_left = x + (15 * mm) + 4 * mm
+            text_top = y + card_height - 3.5 * mm
+
+            c.drawString(text_left, text_top, company[:13])
+            c.drawString(text_left, text_top - 10, product_name[:13])
+            c.drawString(text_left, text_top - 20, f"{display_code[:15]}")
+            c.drawString(text_left, text_top - 30, f"参考上代: {msrp_text}")
+            c.drawString(text_left, text_top - 40, f"卸販売単価: {sales_price}, ロット: {lot}")
+
+            # JANコード
+            if barcode_drawing is not None:
+                draw_barcode_drawing(c, barcode_drawing, x, y, card_width)
 
     c.save()  # PDF保存
-    pdf_buffer.seek(0)
-    return pdf_buffer.getvalue(), company_list, 24
+    return finish_output(pdf_buffer, output), company_list, 24
 
 
 
-def create_price_cards_from_df_18(df):
+def create_price_cards_from_df_18(df, invariant=False, output=None, records=None, symbols=None,
+                                  pages=None):
     """
     18枚シート(3列×6行)用のPDFを生成する。
     要件:
@@ -190,35 +380,21 @@ def create_price_cards_from_df_18(df):
     cards_per_page = cols * rows
 
     # PDFをメモリ上に生成
-    pdf_buffer = BytesIO()
-    c = canvas.Canvas(pdf_buffer, pagesize=A4)
+    pdf_buffer = BytesIO() if output is None else output
+    c = new_canvas(pdf_buffer, invariant)
     default_font_size = 8
     c.setFont("Meiryo", default_font_size)
 
-    needed_columns = ["id", "出展者名", "display_code", "jan", "name", "price", "retail_price"]
-    records = df.to_dict(orient="records")
+    needed_columns = TOB_NEEDED_COLUMNS
+    # records を渡されたときは読み込み済みのものを使う(複数レイアウトの同時作成)。
+    # pages を指定したときはそのページに載る行だけを読み込む(再印刷)
+    records, first_card = page_records(df, records, needed_columns, cards_per_page, pages)
 
-    card_count = 0
     company_list = []  # ★ 会社名を格納するリストを用意
 
-    for record in records:
-        # すべて空欄ならスキップ
-        if all(is_empty_value(record.get(col)) for col in needed_columns):
-            continue
-
-        card_index_on_page = card_count % cards_per_page
-        col_idx = card_index_on_page % cols
-        row_idx = card_index_on_page // cols
-
-        # ページ切り替え (新ページ)
-        if card_index_on_page == 0 and card_count != 0:
-            c.showPage()
-            c.setFont("Meiryo", default_font_size)
-
-        # カードの左下座標
-        x = left_margin + col_idx * card_width
-        y = page_height - top_margin - (row_idx + 1) * card_height
-
+    # すべて空欄の行はスキップされる
+    for record, positions in iter_card_positions(records, needed_columns, cards_per_page, cols,
+                                                 first_card, pages):
         # レコード抽出＆文字列化
         uuid = safe_str(record.get("id", ""))
         company = safe_str(record.get("出展者名", ""))
@@ -231,37 +407,48 @@ def create_price_cards_from_df_18(df):
         # JANコードの取得と変換
         jan_code = parse_jan_code(record.get("jan"))
 
-        # ★ 会社名リストに追加
-        company_list.append(company)
-
-        # QRコード
-        if uuid:
-            draw_qr_code(c, uuid, x, y, card_width, card_height)
-
-        # テキスト表示
-        text_left = x + 2 * mm + 15 * mm + 2 * mm
-        text_top = y + card_height - 2 * mm
-        c.drawString(text_left, text_top, company[:13])
-        c.drawString(text_left, text_top - 10, product_name[:13])
-        c.drawString(text_left, text_top - 20, f"{display_code[:15]}")
-
-        # 一時的なフォントサイズ変更
-        c.setFont("Meiryo", 10)
-        c.drawString(text_left, text_top - 34, f"参考上代: {msrp if msrp else 'オープン'}")
-        c.drawString(text_left, text_top - 48, f"卸販売単価: {sales_price}")
-        c.drawString(text_left, text_top - 62, f"ロット数: {lot}")
-        c.setFont("Meiryo", default_font_size)
-
-        # JANコード
-        if jan_code:
-            draw_barcode(c, jan_code, x, y, card_width, card_height)
+        # QRコードとバーコードはSKUごとに1回だけ作り、枚数分のカードで使い回す
+        qr_img = make_qr_image(uuid, symbols) if uuid else None
+        barcode_drawing = make_barcode_drawing(jan_code, card_height) if jan_code else None
+
+        for col_idx, row_idx, new_page in positions:
+            # ページ切り替え (新ページ)
+            if new_page:
+                c.showPage()
+                c.setFont("Meiryo", default_font_size)
+
+            # カードの左下座標
+            x = left_margin + col_idx * card_width
+            y = page_height - top_margin - (row_idx + 1) * card_height
+
+            # ★ 会社名リストに追加
+            company_list.append(company)
+
+            # QRコード
+            if qr_img is not None:
+                draw_qr_image(c, qr_img, x, y, card_height)
+
+            # テキスト表示
+            text_left = x + 2 * mm + 15 * mm + 2 * mm
+            text_top = y + card_height - 2 * mm
+            c.drawString(text_left, text_top, company[:13])
+            c.drawString(text_left, text_top - 10, product_name[:13])
+            c.drawString(text_left, text_top - 20, f"{display_code[:15]}")
+
+            # 一時的なフォントサイズ変更
+            c.setFont("Meiryo", 10)
+            c.drawString(text_left, text_top - 34, f"参考上代: {msrp if msrp else 'オープン'}")
+            c.drawString(text_left, text_top - 48, f"卸販売単価: {sales_price}")
+            c.drawString(text_left, text_top - 62, f"ロット数: {lot}")
+            c.setFont("Meiryo", default_font_size)
 
-        card_count += 1
+            # JANコード
+            if barcode_drawing is not None:
+                draw_barcode_drawing(c, barcode_drawing, x, y, card_width)
 
     c.showPage()
     c.save()
-    pdf_buffer.seek(0)
-    return pdf_buffer.getvalue(), company_list, 18
+    return finish_output(pdf_buffer, output), company_list, 18
 
 
 def parse_jan_code(jan_value):
@@ -275,17 +462,37 @@ def parse_jan_code(jan_value):
     return None
 
 
-def draw_qr_code(c, uuid, x, y, card_width, card_height):
-    """QRコードを描画する"""
+def make_qr_png(uuid, symbols=None):
+    """
+    QRコードをPNGのバイト列にする。
+    symbols(辞書)を渡すと、同じidのPNGを別のレイアウトのPDFとも使い回す。
+    """
+    if symbols is not None and ("qr", uuid) in symbols:
+        return symbols[("qr", uuid)]
+
     qr = qrcode.QRCode(box_size=2, border=0)
     qr.add_data(uuid)
     qr.make()
     img_qr = qr.make_image(fill_color="black", back_color="white")
     qr_buf = BytesIO()
     img_qr.save(qr_buf, format="PNG")
-    qr_buf.seek(0)
-    qr_img = utils.ImageReader(qr_buf)
+    png = qr_buf.getvalue()
+
+    if symbols is not None:
+        symbols[("qr", uuid)] = png
+    return png
+
+
+def make_qr_image(uuid, symbols=None):
+    """
+    QRコードの画像を作る。同じSKUの複数枚のカードで使い回せる。
+    ImageReader はPDFごとに作る(スレッド間で共有しない)。
+    """
+    return utils.ImageReader(BytesIO(make_qr_png(uuid, symbols)))
+
 
+def draw_qr_image(c, qr_img, x, y, card_height):
+    """作成済みのQRコード画像をカードの左上に描画する"""
     qr_img_width = 15 * mm
     qr_img_height = 15 * mm
     c.drawImage(
@@ -299,24 +506,73 @@ def draw_qr_code(c, uuid, x, y, card_width, card_height):
     )
 
 
-def draw_barcode(c, jan_code, x, y, card_width, card_height):
-    """バーコードを描画する"""
+# 商品画像の印刷サイズ(mm)。QRコードと同じ枠に入れる
+PHOTO_SIZE_MM = 15
+
+
+def draw_photo(c, photo_path, x, y, card_height):
+    """
+    商品画像をカードの左上(QRコードと同じ位置)に描画する。
+    ファイルパスで渡すので、同じ画像はPDF内で1回だけ埋め込まれる。
+    """
+    photo_width = PHOTO_SIZE_MM * mm
+    photo_height = PHOTO_SIZE_MM * mm
+    c.drawImage(
+        photo_path,
+        x + 2 * mm,
+        y + card_height - photo_height - 2 * mm,
+        width=photo_width,
+        height=photo_height,
+        preserveAspectRatio=True,
+        anchor="c",
+        mask="auto",
+    )
+
+
+def find_photo(image_index, display_code, jan_code, symbols=None):
+    """品番またはJANで商品画像の縮小版を探す。symbols を渡すと結果を使い回す"""
+    key = ("photo", display_code, jan_code)
+    if symbols is not None and key in symbols:
+        return symbols[key]
+    photo_path = product_photo(image_index, [display_code, jan_code], PHOTO_SIZE_MM, PHOTO_SIZE_MM)
+    if symbols is not None:
+        symbols[key] = photo_path
+    return photo_path
+
+
+def draw_qr_code(c, uuid, x, y, card_width, card_height):
+    """QRコードを描画する"""
+    draw_qr_image(c, make_qr_image(uuid), x, y, card_height)
+
+
+def make_barcode_drawing(jan_code, card_height):
+    """バーコードのDrawingを作る。同じSKUの複数枚のカードで使い回せる"""
     barcode = eanbc.Ean13BarcodeWidget(jan_code)
     barcode.barHeight = card_height / 3.0
     x1, y1, x2, y2 = barcode.getBounds()
     barcode_width = x2 - x1
     barcode_height = y2 - y1
 
-    barcode_x = x + card_width - barcode_width - 2 * mm
-    barcode_y = y + 2 * mm
-
     barcode_drawing = Drawing(barcode_width, barcode_height)
     barcode_drawing.add(barcode)
+    return barcode_drawing
+
+
+def draw_barcode_drawing(c, barcode_drawing, x, y, card_width):
+    """作成済みのバーコードをカードの右下に描画する"""
+    barcode_x = x + card_width - barcode_drawing.width - 2 * mm
+    barcode_y = y + 2 * mm
     renderPDF.draw(barcode_drawing, c, barcode_x, barcode_y)
 
 
+def draw_barcode(c, jan_code, x, y, card_width, card_height):
+    """バーコードを描画する"""
+    draw_barcode_drawing(c, make_barcode_drawing(jan_code, card_height), x, y, card_width)
+
+
 
-def create_price_cards_from_df_18_toc(df):
+def create_price_cards_from_df_18_toc(df, invariant=False, output=None, image_dir=None,
+                                      records=None, symbols=None, pages=None):
     """
     18枚シート(3列×6行)用のPDFを生成する。
     要件:
@@ -350,37 +606,24 @@ def create_price_cards_from_df_18_toc(df):
     cards_per_page = cols * rows
 
     # PDFをメモリ上に生成
-    pdf_buffer = BytesIO()
-    c = canvas.Canvas(pdf_buffer, pagesize=A4)
+    pdf_buffer = BytesIO() if output is None else output
+    c = new_canvas(pdf_buffer, invariant)
     c.setFont("Meiryo", 8)
 
-    needed_columns = ["タグ", "品番", "商品コード", "商品名", "商品単価"]
-    records = df.to_dict(orient='records')
+    needed_columns = TOC_NEEDED_COLUMNS
+    # records を渡されたときは読み込み済みのものを使う(複数レイアウトの同時作成)。
+    # pages を指定したときはそのページに載る行だけを読み込む(再印刷)
+    records, first_card = page_records(df, records, needed_columns, cards_per_page, pages)
+
+    # 商品画像(image_dir 指定時)。フォルダの走査はPDF1つにつき1回だけ
+    image_index = index_image_dir(image_dir) if image_dir else {}
 
-    card_count = 0
     # ★ 会社名を格納するリストを用意
     company_list = []
 
-    for i, record in enumerate(records):
-        # すべて空欄ならスキップ
-        if all(is_empty_value(record.get(col)) for col in needed_columns):
-            continue
-
-        card_index_on_page = card_count % cards_per_page
-        col_idx = card_index_on_page % cols
-        row_idx = card_index_on_page // cols
-
-        # ページ切り替え (新ページ)
-        if card_index_on_page == 0 and card_count != 0:
-            c.showPage()
-            c.setFont("Meiryo", 8)
-
-        # カードの左下座標
-        # row=0 が最上段なので、通常は y = page_height - top_margin - (row+1)*card_height で計算
-        # col=0 が最左列
-        x = left_margin + col_idx * card_width
-        y = page_height - top_margin - (row_idx + 1) * card_height
-
+    # すべて空欄の行はスキップされる
+    for record, positions in iter_card_positions(records, needed_columns, cards_per_page, cols,
+                                                 first_card, pages):
         # レコード抽出＆文字列化
         # uuid = safe_str(record.get('id', ''))
         company = safe_str(record.get('タグ', ''))
@@ -398,30 +641,14 @@ def create_price_cards_from_df_18_toc(df):
 
         # 2) 計算して丸める
         salesprice_intax = round(msrp_val * 1.1)  # 小数点以下を四捨五入する
-        
-        # ★ 会社名リストに追加
-        company_list.append(company)
-        
-
-        # テキスト表示位置
-        text_left = x + 2*mm + 15*mm + 2*mm
-        text_top = y + card_height - 2*mm
-
-        # テキスト表示
-        c.drawString(text_left, text_top, company[:13])
-        c.drawString(text_left, text_top - 10, product_name[:13])
-        c.drawString(text_left, text_top - 20, f"{display_code[:15]}")
-        # ★ここで大きなサイズに変更(例: 10pt)
-        c.setFont("Meiryo", 14)
-        c.drawString(text_left, text_top - 36, f"税込 {salesprice_intax} 円")
-        # c.drawString(text_left, text_top - 50, f"Lot: {lot}")
 
-        # 使い終わったら、元のサイズ(8pt)に戻す
-        c.setFont("Meiryo", 8)
+        # 商品画像は品番またはJANで探し、印刷サイズに縮小済みのものを使う
+        photo_path = None
+        if image_index:
+            photo_path = find_photo(image_index, display_code, jan_code, symbols)
 
-
-
-        # JANコード (右下)
+        # バーコードはSKUごとに1回だけ作り、枚数分のカードで使い回す
+        barcode_drawing = None
         if jan_code.isdigit():
             # 長さ補正
             if len(jan_code) < 13:
@@ -429,27 +656,53 @@ def create_price_cards_from_df_18_toc(df):
             elif len(jan_code) > 13:
                 jan_code = jan_code[:13]
 
-            barcode = eanbc.Ean13BarcodeWidget(jan_code)
-            barcode.barHeight = card_height / 3.0
-            x1, y1, x2, y2 = barcode.getBounds()
-            barcode_width = x2 - x1
-            barcode_height = y2 - y1
-
-            barcode_x = x + card_width - barcode_width - 2*mm
-            barcode_y = y + 2*mm
-
-            barcode_drawing = Drawing(barcode_width, barcode_height)
-            barcode_drawing.add(barcode)
-            renderPDF.draw(barcode_drawing, c, barcode_x, barcode_y)
+            barcode_drawing = make_barcode_drawing(jan_code, card_height)
+
+        for col_idx, row_idx, new_page in positions:
+            # ページ切り替え (新ページ)
+            if new_page:
+                c.showPage()
+                c.setFont("Meiryo", 8)
+
+            # カードの左下座標
+            # row=0 が最上段なので、通常は y = page_height - top_margin - (row+1)*card_height で計算
+            # col=0 が最左列
+            x = left_margin + col_idx * card_width
+            y = page_height - top_margin - (row_idx + 1) * card_height
+
+            # ★ 会社名リストに追加
+            company_list.append(company)
+
+            # 商品画像 (左上)
+            if photo_path is not None:
+                draw_photo(c, photo_path, x, y, card_height)
+
+            # テキスト表示位置
+            text_left = x + 2*mm + 15*mm + 2*mm
+            text_top = y + card_height - 2*mm
+
+            # テキスト表示
+            c.drawString(text_left, text_top, company[:13])
+            c.drawString(text_left, text_top - 10, product_name[:13])
+            c.drawString(text_left, text_top - 20, f"{display_code[:15]}")
+            # ★ここで大きなサイズに変更(例: 10pt)
+            c.setFont("Meiryo", 14)
+            c.drawString(text_left, text_top - 36, f"税込 {salesprice_intax} 円")
+            # c.drawString(text_left, text_top - 50, f"Lot: {lot}")
+
+            # 使い終わったら、元のサイズ(8pt)に戻す
+            c.setFont("Meiryo", 8)
 
-        card_count += 1
+            # JANコード (右下)
+            if barcode_drawing is not None:
+                draw_barcode_drawing(c, barcode_drawing, x, y, card_width)
 
     c.showPage()
     c.save()
-    pdf_buffer.seek(0)
-    return pdf_buffer.getvalue(),company_list,18
+    return finish_output(pdf_buffer, output),company_list,18
 
-def create_price_cards_from_df_24_toc(df):
+def create_price_cards_from_df_24_toc(df, invariant=False, output=None, image_dir=None,
+                                      records=None, symbols=None, pages=None):
     """
     24枚シート(8行×3列)用のPDFを生成する例。
     （既存コードをそのまま引用）
@@ -466,32 +719,23 @@ def create_price_cards_from_df_24_toc(df):
     rows = 8
     cards_per_page = cols * rows
 
-    pdf_buffer = BytesIO()
-    c = canvas.Canvas(pdf_buffer, pagesize=A4)
+    pdf_buffer = BytesIO() if output is None else output
+    c = new_canvas(pdf_buffer, invariant)
     c.setFont("Meiryo", 8)
 
-    needed_columns = ["タグ", "品番", "商品コード", "商品名", "商品単価"]
-    records = df.to_dict(orient='records')
+    needed_columns = TOC_NEEDED_COLUMNS
+    # records を渡されたときは読み込み済みのものを使う(複数レイアウトの同時作成)。
+    # pages を指定したときはそのページに載る行だけを読み込む(再印刷)
+    records, first_card = page_records(df, records, needed_columns, cards_per_page, pages)
+
+    # 商品画像(image_dir 指定時)。フォルダの走査はPDF1つにつき1回だけ
+    image_index = index_image_dir(image_dir) if image_dir else {}
 
-    card_count = 0
     # ★ 会社名を格納するリストを用意
     company_list = []
 
-    for i, record in enumerate(records):
-        if all(is_empty_value(record.get(col)) for col in needed_columns):
-            continue
-
-        card_index_on_page = card_count % cards_per_page
-        col_idx = card_index_on_page % cols
-        row_idx = card_index_on_page // cols
-
-        if card_index_on_page == 0 and card_count != 0:
-            c.showPage()
-            c.setFont("Meiryo", 8)
-
-        x = left_margin + col_idx * card_width
-        y = page_height - top_margin - (row_idx + 1) * card_height
-
+    for record, positions in iter_card_positions(records, needed_columns, cards_per_page, cols,
+                                                 first_card, pages):
         # レコード抽出＆文字列化
         # uuid = safe_str(record.get('id', ''))
         company = safe_str(record.get('タグ', ''))
@@ -508,57 +752,63 @@ def create_price_cards_from_df_24_toc(df):
 
         # 2) 計算して丸める
         salesprice_intax = round(msrp_val * 1.1)  # 小数点以下を四捨五入する
-        
-        
-        # ★ 会社名リストに追加
-        company_list.append(company)
-        
-
-
-        # テキスト
-        text_left = x + (15 * mm) + 4 * mm
-        text_top = y + card_height - 3.5*mm
-        c.drawString(text_left, text_top, company[:13])
-        c.drawString(text_left, text_top - 10, product_name[:13])
-        c.drawString(text_left, text_top - 20, f"{display_code[:15]}")
-          # ★ここで大きなサイズに変更(例: 10pt)
-        c.setFont("Meiryo", 14)
-        c.drawString(text_left, text_top - 36, f" 税込{salesprice_intax} 円")
-        # 使い終わったら、元のサイズ(8pt)に戻す
-        c.setFont("Meiryo", 8)
-
-
-        # JANコード
+
+        # 商品画像は品番またはJANで探し、印刷サイズに縮小済みのものを使う
+        photo_path = None
+        if image_index:
+            photo_path = find_photo(image_index, display_code, jan_code, symbols)
+
+        # バーコードはSKUごとに1回だけ作り、枚数分のカードで使い回す
+        barcode_drawing = None
         if jan_code.isdigit():
+            # 長さ補正
             if len(jan_code) < 13:
                 jan_code = jan_code.zfill(13)
             elif len(jan_code) > 13:
                 jan_code = jan_code[:13]
 
-            barcode = eanbc.Ean13BarcodeWidget(jan_code)
-            barcode.barHeight = card_height / 3.0
-            x1, y1, x2, y2 = barcode.getBounds()
-            barcode_width = x2 - x1
-            barcode_height = y2 - y1
-
-            barcode_x = x + card_width - barcode_width - 2*mm
-            barcode_y = y + 2*mm
-
-            barcode_drawing = Drawing(barcode_width, barcode_height)
-            barcode_drawing.add(barcode)
-            renderPDF.draw(barcode_drawing, c, barcode_x, barcode_y)
+            barcode_drawing = make_barcode_drawing(jan_code, card_height)
+
+        for col_idx, row_idx, new_page in positions:
+            if new_page:
+                c.showPage()
+                c.setFont("Meiryo", 8)
+
+            x = left_margin + col_idx * card_width
+            y = page_height - top_margin - (row_idx + 1) * card_height
+
+            # ★ 会社名リストに追加
+            company_list.append(company)
+
+            # 商品画像 (左上)
+            if photo_path is not None:
+                draw_photo(c, photo_path, x, y, card_height)
+
+            # テキスト
+            text_left = x + (15 * mm) + 4 * mm
+            text_top = y + card_height - 3.5*mm
+            c.drawString(text_left, text_top, company[:13])
+            c.drawString(text_left, text_top - 10, product_name[:13])
+            c.drawString(text_left, text_top - 20, f"{display_code[:15]}")
+            # ★ここで大きなサイズに変更(例: 10pt)
+            c.setFont("Meiryo", 14)
+            c.drawString(text_left, text_top - 36, f" 税込{salesprice_intax} 円")
+            # 使い終わったら、元のサイズ(8pt)に戻す
+            c.setFont("Meiryo", 8)
 
-        card_count += 1
+            # JANコード
+            if barcode_drawing is not None:
+                draw_barcode_drawing(c, barcode_drawing, x, y, card_width)
 
     c.showPage()
     c.save()
-    pdf_buffer.seek(0)
-    return pdf_buffer.getvalue(),company_list,24
+    return finish_output(pdf_buffer, output),company_list,24
 
 
 
 
-def create_price_cards_from_df_24_fuku(df):
+def create_price_cards_from_df_24_fuku(df, invariant=False, output=None, records=None, symbols=None,
+                                       pages=None):
     """
     24枚シート(8行×3列)用のPDFを生成する例。
     """
@@ -574,31 +824,19 @@ def create_price_cards_from_df_24_fuku(df):
     rows = 8
     cards_per_page = cols * rows
 
-    pdf_buffer = BytesIO()
-    c = canvas.Canvas(pdf_buffer, pagesize=A4)
+    pdf_buffer = BytesIO() if output is None else output
+    c = new_canvas(pdf_buffer, invariant)
     c.setFont("Meiryo", 8)
 
-    needed_columns = ["id", "出展者名", "display_code", "jan", "name", "price", "retail_price"]
-    records = df.to_dict(orient="records")
+    needed_columns = TOB_NEEDED_COLUMNS
+    # records を渡されたときは読み込み済みのものを使う(複数レイアウトの同時作成)。
+    # pages を指定したときはそのページに載る行だけを読み込む(再印刷)
+    records, first_card = page_records(df, records, needed_columns, cards_per_page, pages)
 
-    card_count = 0
     company_list = []  # ★ 会社名を格納するリストを用意
 
-    for i, record in enumerate(records):
-        if all(is_empty_value(record.get(col)) for col in needed_columns):
-            continue
-
-        card_index_on_page = card_count % cards_per_page
-        col_idx = card_index_on_page % cols
-        row_idx = card_index_on_page // cols
-
-        if card_index_on_page == 0 and card_count != 0:
-            c.showPage()  # 新しいページを作成
-            c.setFont("Meiryo", 8)
-
-        x = left_margin + col_idx * card_width
-        y = page_height - top_margin - (row_idx + 1) * card_height
-
+    for record, positions in iter_card_positions(records, needed_columns, cards_per_page, cols,
+                                                 first_card, pages):
         uuid = safe_str(record.get('id', ''))
         company = safe_str(record.get('出展者名', ''))
         company='福花園種苗（株）'
@@ -621,36 +859,9 @@ def create_price_cards_from_df_24_fuku(df):
         sales_price = safe_str(record.get('unit_price', ''))  # 卸単価
         lot = safe_str(record.get('lot', ''))  # 販売ロット
 
-        company_list.append(company)  # ★ 会社名リストに追加
-
-        # QRコード
-        if uuid:
-            qr = qrcode.QRCode(box_size=2, border=0)
-            qr.add_data(uuid)
-            qr.make()
-            img_qr = qr.make_image(fill_color="black", back_color="white")
-            qr_buf = BytesIO()
-            img_qr.save(qr_buf, format='PNG')
-            qr_buf.seek(0)
-            qr_img = utils.ImageReader(qr_buf)
-
-            qr_img_width = 15 * mm
-            qr_img_height = 15 * mm
-            c.drawImage(qr_img, x + 2 * mm, y + card_height - qr_img_height - 2 * mm,
-                        width=qr_img_width, height=qr_img_height, preserveAspectRatio=True, mask='auto')
-
-        # テキスト
-        text_left = x + (15 * mm) + 4 * mm
-        text_top = y + card_height - 3.5 * mm
-
-        # c.drawString(text_left, text_top, company[:13])
-        c.drawString(text_left, text_top, product_name[:13])
-        c.drawString(text_left, text_top - 10, product_name[14:27])
-        c.drawString(text_left, text_top - 20, f"{display_code[:15]}")
-        c.drawString(text_left, text_top - 30, f"参考上代: {msrp_text}")
-        c.drawString(text_left, text_top - 40, f"卸販売単価: {sales_price}, ロット: {lot}")
-
-        # JANコードの処理
+        # QRコードとバーコードはSKUごとに1回だけ作り、枚数分のカードで使い回す
+        qr_img = make_qr_image(uuid, symbols) if uuid else None
+        barcode_drawing = None
         if jan_code is not None:  # jan_codeがNoneでない場合のみ処理を行う
             jan_code_str = str(jan_code)
 
@@ -659,28 +870,44 @@ def create_price_cards_from_df_24_fuku(df):
             elif len(jan_code_str) > 13:
                 jan_code_str = jan_code_str[:13]
 
-            barcode = eanbc.Ean13BarcodeWidget(jan_code_str)
-            barcode.barHeight = card_height / 3.0
-            x1, y1, x2, y2 = barcode.getBounds()
-            barcode_width = x2 - x1
-            barcode_height = y2 - y1
+            barcode_drawing = make_barcode_drawing(jan_code_str, card_height)
+
+        for col_idx, row_idx, new_page in positions:
+            if new_page:
+                c.showPage()  # 新しいページを作成
+                c.setFont("Meiryo", 8)
+
+            x = left_margin + col_idx * card_width
+            y = page_height - top_margin - (row_idx + 1) * card_height
+
+            company_list.append(company)  # ★ 会社名リストに追加
+
+            # QRコード
+            if qr_img is not None:
+                draw_qr_image(c, qr_img, x, y, card_height)
 
-            barcode_x = x + card_width - barcode_width - 2 * mm
-            barcode_y = y + 2 * mm
+            # テキスト
+            text_left = x + (15 * mm) + 4 * mm
+            text_top = y + card_height - 3.5 * mm
 
-            barcode_drawing = Drawing(barcode_width, barcode_height)
-            barcode_drawing.add(barcode)
-            renderPDF.draw(barcode_drawing, c, barcode_x, barcode_y)
+            # c.drawString(text_left, text_top, company[:13])
+            c.drawString(text_left, text_top, product_name[:13])
+            c.drawString(text_left, text_top - 10, product_name[14:27])
+            c.drawString(text_left, text_top - 20, f"{display_code[:15]}")
+            c.drawString(text_left, text_top - 30, f"参考上代: {msrp_text}")
+            c.drawString(text_left, text_top - 40, f"卸販売単価: {sales_price}, ロット: {lot}")
 
-        card_count += 1  # カード生成ごとにインクリメント
+            # JANコード
+            if barcode_drawing is not None:
+                draw_barcode_drawing(c, barcode_drawing, x, y, card_width)
 
     c.save()  # PDF保存
-    pdf_buffer.seek(0)
-    return pdf_buffer.getvalue(), company_list, 24
+    return finish_output(pdf_buffer, output), company_list, 24
 
 
 
-def create_price_cards_from_df_18_fuku(df):
+def create_price_cards_from_df_18_fuku(df, invariant=False, output=None, records=None, symbols=None,
+                                       pages=None):
     """
     18枚シート(3列×6行)用のPDFを生成する。
     要件:
@@ -712,35 +939,21 @@ def create_price_cards_from_df_18_fuku(df):
     cards_per_page = cols * rows
 
     # PDFをメモリ上に生成
-    pdf_buffer = BytesIO()
-    c = canvas.Canvas(pdf_buffer, pagesize=A4)
+    pdf_buffer = BytesIO() if output is None else output
+    c = new_canvas(pdf_buffer, invariant)
     default_font_size = 8
     c.setFont("Meiryo", default_font_size)
 
-    needed_columns = ["id", "出展者名", "display_code", "jan", "name", "price", "retail_price"]
-    records = df.to_dict(orient="records")
+    needed_columns = TOB_NEEDED_COLUMNS
+    # records を渡されたときは読み込み済みのものを使う(複数レイアウトの同時作成)。
+    # pages を指定したときはそのページに載る行だけを読み込む(再印刷)
+    records, first_card = page_records(df, records, needed_columns, cards_per_page, pages)
 
-    card_count = 0
     company_list = []  # ★ 会社名を格納するリストを用意
 
-    for record in records:
-        # すべて空欄ならスキップ
-        if all(is_empty_value(record.get(col)) for col in needed_columns):
-            continue
-
-        card_index_on_page = card_count % cards_per_page
-        col_idx = card_index_on_page % cols
-        row_idx = card_index_on_page // cols
-
-        # ページ切り替え (新ページ)
-        if card_index_on_page == 0 and card_count != 0:
-            c.showPage()
-            c.setFont("Meiryo", default_font_size)
-
-        # カードの左下座標
-        x = left_margin + col_idx * card_width
-        y = page_height - top_margin - (row_idx + 1) * card_height
-
+    # すべて空欄の行はスキップされる
+    for record, positions in iter_card_positions(records, needed_columns, cards_per_page, cols,
+                                                 first_card, pages):
         # レコード抽出＆文字列化
         uuid = safe_str(record.get("id", ""))
         company = safe_str(record.get("出展者名", ""))
@@ -754,36 +967,92 @@ def create_price_cards_from_df_18_fuku(df):
         # JANコードの取得と変換
         jan_code = parse_jan_code(record.get("jan"))
 
-        # ★ 会社名リストに追加
-        company_list.append(company)
+        # QRコードとバーコードはSKUごとに1回だけ作り、枚数分のカードで使い回す
+        qr_img = make_qr_image(uuid, symbols) if uuid else None
+        barcode_drawing = make_barcode_drawing(jan_code, card_height) if jan_code else None
+
+        for col_idx, row_idx, new_page in positions:
+            # ページ切り替え (新ページ)
+            if new_page:
+                c.showPage()
+                c.setFont("Meiryo", default_font_size)
+
+            # カードの左下座標
+            x = left_margin + col_idx * card_width
+            y = page_height - top_margin - (row_idx + 1) * card_height
+
+            # ★ 会社名リストに追加
+            company_list.append(company)
+
+            # QRコード
+            if qr_img is not None:
+                draw_qr_image(c, qr_img, x, y, card_height)
+
+            # テキスト表示
+            text_left = x + 2 * mm + 15 * mm + 2 * mm
+            text_top = y + card_height - 2 * mm
+            # c.drawString(text_left, text_top, company[:13])
+            c.drawString(text_left, text_top, product_name[:13])
+            c.drawString(text_left, text_top - 10, product_name[13:27])
+            c.drawString(text_left, text_top - 20, f"{display_code[:15]}")
+
+            # 一時的なフォントサイズ変更
+            c.setFont("Meiryo", 10)
+            c.drawString(text_left, text_top - 34, f"参考上代: {msrp if msrp else 'オープン'}")
+            c.drawString(text_left, text_top - 48, f"卸販売単価: {sales_price}")
+            c.drawString(text_left, text_top - 62, f"ロット数: {lot}")
+            c.setFont("Meiryo", default_font_size)
 
-        # QRコード
-        if uuid:
-            draw_qr_code(c, uuid, x, y, card_width, card_height)
+            # JANコード
+            if barcode_drawing is not None:
+                draw_barcode_drawing(c, barcode_drawing, x, y, card_width)
 
-        # テキスト表示
-        text_left = x + 2 * mm + 15 * mm + 2 * mm
-        text_top = y + card_height - 2 * mm
-        # c.drawString(text_left, text_top, company[:13])
-        c.drawString(text_left, text_top, product_name[:13])
-        c.drawString(text_left, text_top - 10, product_name[13:27])
-        c.drawString(text_left, text_top - 20, f"{display_code[:15]}")
+    c.showPage()
+    c.save()
+    return finish_output(pdf_buffer, output), company_list, 18
 
-        # 一時的なフォントサイズ変更
-        c.setFont("Meiryo", 10)
-        c.drawString(text_left, text_top - 34, f"参考上代: {msrp if msrp else 'オープン'}")
-        c.drawString(text_left, text_top - 48, f"卸販売単価: {sales_price}")
-        c.drawString(text_left, text_top - 62, f"ロット数: {lot}")
-        c.setFont("Meiryo", default_font_size)
 
-        # JANコード
-        if jan_code:
-            draw_barcode(c, jan_code, x, y, card_width, card_height)
 
-        card_count += 1
+# レイアウト名 → (生成関数, 空欄判定の列, 1ページのカード枚数)
+LAYOUTS = {
+    "toB_18": (create_price_cards_from_df_18, TOB_NEEDED_COLUMNS, 18),
+    "toB_24": (create_price_cards_from_df_24, TOB_NEEDED_COLUMNS, 24),
+    "toC_18": (create_price_cards_from_df_18_toc, TOC_NEEDED_COLUMNS, 18),
+    "toC_24": (create_price_cards_from_df_24_toc, TOC_NEEDED_COLUMNS, 24),
+    "fuku_18": (create_price_cards_from_df_18_fuku, TOB_NEEDED_COLUMNS, 18),
+    "fuku_24": (create_price_cards_from_df_24_fuku, TOB_NEEDED_COLUMNS, 24),
+}
 
-    c.showPage()
-    c.save()
-    pdf_buffer.seek(0)
-    return pdf_buffer.getvalue(), company_list, 18
+def layout_of(create_func):
+    """生成関数からレイアウト名・空欄判定の列・1ページのカード枚数を引く"""
+    for name, (func, needed_columns, cards_per_page) in LAYOUTS.items():
+        if func is create_func:
+            return name, needed_columns, cards_per_page
+    raise ValueError(f"未登録の生成関数です: {create_func.__name__}")
 
+def create_price_cards_multi(df, layout_names, max_workers=None, **create_kwargs):
+    """
+    1回読み込んだDataFrameから複数のレイアウト(LAYOUTS のキー)のPDFをまとめて作る。
+    to_dict の結果とQRコード等のシンボルは全レイアウトで共有し、PDFの描画は並行して行う。
+    create_kwargs は各生成関数にそのまま渡す。
+    戻り値: {レイアウト名: (PDFのバイト列, 会社名リスト, レイアウト)}
+    """
+    unknown = [name for name in layout_names if name not in LAYOUTS]
+    if unknown:
+        raise ValueError(f"未登録のレイアウトです: {', '.join(unknown)}")
+
+    records = list(iter_records(df))
+    symbols = {}
+    # QRコードは先に1回ずつ作っておき、描画中のスレッドは読むだけにする
+    if any(not name.startswith("toC") for name in layout_names):
+        for record in records:
+            uuid = safe_str(record.get("id", ""))
+            if uuid:
+                make_qr_png(uuid, symbols)
+
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len(layout_names))) as executor:
+        futures = {
+            name: executor.submit(LAYOUTS[name][0], df, records=records, symbols=symbols, **create_kwargs)
+            for name in layout_names
+        }
+        return {name: future.result() for name, future in futures.items()}
@@ -0,0 +1,143 @@
+"""
+ローカルの商品マスタ(SQLite)。
+
+商品の行を id / jan / 商品コード をキーにして保存しておき、
+キーだけ(と必要なら上書きしたい列だけ)のアップロードをマスタと一括結合してから
+カードを作れるようにする。toB / toC どちらの形式の行も同じテーブルに入る。
+"""
+import json
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+from pricecards import KEY_COLUMNS, detect_key_column, is_empty_value, non_empty_mask, normalize_key
+
+MASTER_DB = os.environ.get("PRICECARD_MASTER_DB", "product_master.sqlite3")
+
+# 一度に executemany する行数
+BATCH_ROWS = 5000
+
+
+def connect(db_path=MASTER_DB):
+    """マスタに接続する。テーブルが無ければ作る"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS products (
+            key_column TEXT NOT NULL,
+            key TEXT NOT NULL,
+            record TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (key_column, key)
+        ) WITHOUT ROWID
+    """)
+    return conn
+
+
+def _json_records(df):
+    """行をJSON文字列にする。空欄(NaN・空白だけの文字列)の列は含めない"""
+    for record in json.loads(df.to_json(orient="records", force_ascii=False)):
+        yield json.dumps(
+            {k: v for k, v in record.items() if v is not None and not is_empty_value(v)},
+            ensure_ascii=False,
+        )
+
+
+def _keep_integers(frame):
+    """
+    欠損を含んでも整数の列は整数のまま(nullable の Int64)にする。
+    float64 になると 1500 が「1500.0」と印字されてしまうため。
+    """
+    return frame.convert_dtypes(convert_string=False, convert_boolean=False, convert_floating=False)
+
+
+def import_master(df, db_path=MASTER_DB):
+    """
+    アップロードされた行をマスタへ登録する。
+    同じキーが登録済みなら、空欄でない列だけを既存の内容に上書きする(行ごと置き換えはしない)。
+    キーと一部の列だけのアップロードを登録しても、ほかの列は消えない。
+    行に含まれるキー列(id / jan / 商品コード)それぞれで引けるように登録する。
+    戻り値: 登録した行数
+    """
+    key_columns = [col for col in KEY_COLUMNS if col in df.columns]
+    if not key_columns:
+        raise ValueError("商品マスタへの登録には id / jan / 商品コード のいずれかの列が必要です")
+
+    now = time.time()
+    imported = 0
+    conn = connect(db_path)
+    try:
+        with conn:
+            for start in range(0, len(df), BATCH_ROWS):
+                chunk = df.iloc[start:start + BATCH_ROWS]
+                records = list(_json_records(chunk))
+                for key_column in key_columns:
+                    keys = normalize_key(chunk[key_column]).tolist()
+                    conn.executemany(
+                        "INSERT INTO products (key_column, key, record, updated_at) "
+                        "VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (key_column, key) DO UPDATE SET "
+                        "record = json_patch(products.record, excluded.record), "
+                        "updated_at = excluded.updated_at",
+                        [(key_column, key, record, now)
+                         for key, record in zip(keys, records) if not pd.isna(key)],
+                    )
+                imported += len(chunk)
+    finally:
+        conn.close()
+    return imported
+
+
+def lookup_master(keys, key_column, db_path=MASTER_DB):
+    """
+    キーの列(正規化済み)をマスタと一括結合し、各行に対応するマスタの値をDataFrameで返す。
+    キーを一時テーブルに入れて主キーのインデックスで結合するので、行ごとの問い合わせはしない。
+    見つからない行はすべて欠損になる。整数の列は欠損があっても Int64 のまま返す。
+    """
+    conn = connect(db_path)
+    try:
+        conn.execute("CREATE TEMP TABLE upload_keys (pos INTEGER PRIMARY KEY, key TEXT NOT NULL)")
+        conn.executemany(
+            "INSERT INTO upload_keys (pos, key) VALUES (?, ?)",
+            [(pos, key) for pos, key in enumerate(keys.tolist()) if not pd.isna(key)],
+        )
+        rows = conn.execute(
+            "SELECT u.pos, p.record FROM upload_keys AS u "
+            "JOIN products AS p ON p.key_column = ? AND p.key = u.key",
+            (key_column,),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    positions = [pos for pos, _ in rows]
+    master = pd.DataFrame.from_records([json.loads(record) for _, record in rows], index=positions)
+    return _keep_integers(master.reindex(range(len(keys))))
+
+
+def join_master(df, db_path=MASTER_DB, key_column=None):
+    """
+    キーだけのアップロードをマスタで補完する。
+    アップロード側で空欄でない値はそのまま優先し(上書き)、空欄の列だけマスタの値で埋める。
+    整数の列は欠損があっても整数のまま残すので、全列そろったアップロードと同じ表記で印字される。
+    戻り値: (補完したDataFrame, マスタに見つからなかったキーのリスト)
+    """
+    if key_column is None:
+        key_column = detect_key_column(df)
+    if key_column is None:
+        raise ValueError("商品マスタの参照には id / jan / 商品コード のいずれかの列が必要です")
+
+    result = df.reset_index(drop=True)
+    keys = normalize_key(result[key_column])
+    master = lookup_master(keys, key_column, db_path)
+
+    for col in master.columns:
+        if col in result.columns:
+            filled = non_empty_mask(result, [col])
+            result[col] = _keep_integers(result[[col]])[col].where(filled, master[col])
+        else:
+            result[col] = master[col]
+
+    found = master.notna().any(axis=1).to_numpy()
+    unmatched = keys[keys.notna().to_numpy() & ~found].tolist()
+    return result, unmatched
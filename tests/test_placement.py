@@ -0,0 +1,98 @@
+"""
+カード配置の回帰テスト。
+
+枚数(copies / 枚数)・空欄の行を含むデータで、
+  - ベクトル演算の card_counts と1行ずつの parse_copies が一致すること
+  - pages=(a, b) で作った再印刷が、全体を作ったときの a〜b ページと同じ配置になること
+を確かめる。pricecards はフォント NotoSansJP-Regular.ttf を読み込むので、
+リポジトリのルート(フォントを置いた場所)で pytest を実行する。
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import pricecards
+except Exception as e:  # フォントが無い環境では実行できない
+    pytest.skip(f"pricecards を読み込めません: {e!r}", allow_module_level=True)
+
+from pricecards import (
+    LAYOUTS, TOB_NEEDED_COLUMNS, card_counts, iter_card_positions, iter_records,
+    page_records, parse_copies,
+)
+
+COPIES = ["3", "", "２０", "0", None, "１", "2.7", "x", "-1", "1e30", "5", "７"]
+
+
+def make_df(copies_column="枚数"):
+    """枚数と空欄の行を含む toB 形式のデータ。3行ごとに1行はすべて空欄"""
+    rows = []
+    for i, copies in enumerate(COPIES * 3):
+        blank = i % 3 == 1
+        rows.append({
+            "id": None if blank else f"id-{i:03d}",
+            "出展者名": None if blank else f"出展者{i:03d}",
+            "display_code": None if blank else f"A-{i:03d}",
+            "jan": None if blank else float(4900000000000 + i),
+            "name": None if blank else f"商品{i}",
+            "price": None if blank else 1000 + i,
+            "retail_price": None if blank else 1500 + i,
+            copies_column: copies,
+        })
+    return pd.DataFrame(rows)
+
+
+def placements(df, cards_per_page, cols, pages=None):
+    """生成関数と同じ手順で (ページ, 列, 行, id) をカードごとに並べる"""
+    records, first_card = page_records(df, None, TOB_NEEDED_COLUMNS, cards_per_page, pages)
+    page = 0 if pages is None else pages[0] - 1
+    result = []
+    for record, positions in iter_card_positions(records, TOB_NEEDED_COLUMNS, cards_per_page, cols,
+                                                 first_card, pages):
+        for col_idx, row_idx, new_page in positions:
+            if new_page:
+                page += 1
+            result.append((page, col_idx, row_idx, record["id"]))
+    return result
+
+
+@pytest.mark.parametrize("copies_column", ["枚数", "copies"])
+def test_card_counts_matches_parse_copies(copies_column):
+    df = make_df(copies_column)
+    expected = [
+        0 if all(pricecards.is_empty_value(record.get(col)) for col in TOB_NEEDED_COLUMNS)
+        else parse_copies(record)
+        for record in iter_records(df)
+    ]
+    assert card_counts(df, TOB_NEEDED_COLUMNS).tolist() == expected
+
+
+@pytest.mark.parametrize("cards_per_page, cols", [(18, 3), (24, 3)])
+@pytest.mark.parametrize("pages", [(1, 1), (2, 2), (2, 4), (5, 5), (7, 9)])
+def test_page_range_matches_full_document(cards_per_page, cols, pages):
+    df = make_df()
+    full = placements(df, cards_per_page, cols)
+    first_page, last_page = pages
+    expected = [card for card in full if first_page - 1 <= card[0] <= last_page - 1]
+    assert placements(df, cards_per_page, cols, pages) == expected
+
+
+@pytest.mark.parametrize("layout_name", ["toB_18", "toB_24"])
+def test_page_range_render_matches_full_render(layout_name):
+    create_func, _, cards_per_page = LAYOUTS[layout_name]
+    df = make_df()
+    _, full_companies, _ = create_func(df)
+    pages = (2, 3)
+    _, companies, _ = create_func(df, pages=pages)
+    assert companies == full_companies[cards_per_page:cards_per_page * 3]
+
+
+def test_page_range_past_the_end_is_empty():
+    df = make_df()
+    total_pages = int(np.ceil(card_counts(df, TOB_NEEDED_COLUMNS).sum() / 18))
+    assert placements(df, 18, 3, (total_pages + 1, total_pages + 2)) == []
@@ -0,0 +1,106 @@
+"""
+商品画像の縮小版(サムネイル)キャッシュ。
+
+カメラで撮った元画像をそのままPDFに埋め込むと非常に大きくなるので、
+カードに印刷される大きさとDPIにちょうど合わせて1度だけ縮小し、ディスクにキャッシュする。
+元画像の更新時刻(mtime)が変わったら作り直す。
+"""
+import hashlib
+import logging
+import os
+import threading
+
+from PIL import Image, ImageOps
+
+IMAGE_DIR = os.environ.get("PRICECARD_IMAGE_DIR", "product_images")
+THUMB_CACHE_DIR = ".pricecard_thumbs"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+# 印刷時の解像度
+PHOTO_DPI = 300
+
+logger = logging.getLogger("pricecards.photos")
+
+
+def resolve_image_dir(image_dir, base_dir=IMAGE_DIR):
+    """
+    画面で入力された画像フォルダ(base_dir からの相対パス)を実際のパスにする。
+    サーバー上の任意のフォルダを読まれないよう、base_dir とその下のフォルダ以外は ValueError。
+    """
+    base = os.path.realpath(base_dir)
+    path = os.path.realpath(os.path.join(base, image_dir or ""))
+    if os.path.commonpath([base, path]) != base:
+        raise ValueError(f"商品画像フォルダは {base_dir} の中を指定してください: {image_dir}")
+    return path
+
+
+def index_image_dir(image_dir):
+    """画像フォルダを1度だけ走査し、拡張子を除いたファイル名 → パスの辞書を返す"""
+    index = {}
+    if not image_dir or not os.path.isdir(image_dir):
+        return index
+    for entry in os.scandir(image_dir):
+        stem, ext = os.path.splitext(entry.name)
+        if entry.is_file() and ext.lower() in IMAGE_EXTENSIONS:
+            index.setdefault(stem, entry.path)
+    return index
+
+
+def find_product_image(index, keys):
+    """keys(品番・JANなど)のうち最初に画像が見つかったもののパスを返す"""
+    for key in keys:
+        if key and key in index:
+            return index[key]
+    return None
+
+
+def get_thumbnail(src_path, width_mm, height_mm, dpi=PHOTO_DPI, cache_dir=THUMB_CACHE_DIR):
+    """
+    印刷サイズ width_mm × height_mm、解像度 dpi に縮小した画像のパスを返す。
+    キャッシュ済みで元画像のmtimeと一致すればそれを使う(縮小版のmtimeに元画像のmtimeを入れておく)。
+    """
+    src_mtime = os.stat(src_path).st_mtime_ns
+    width_px = max(1, round(width_mm * dpi / 25.4))
+    height_px = max(1, round(height_mm * dpi / 25.4))
+
+    source = f"{os.path.abspath(src_path)}:{width_px}x{height_px}"
+    name = hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+    with Image.open(src_path) as img:
+        has_alpha = img.mode in ("RGBA", "LA") or "transparency" in img.info
+        thumb_path = os.path.join(cache_dir, name + (".png" if has_alpha else ".jpg"))
+        try:
+            if os.stat(thumb_path).st_mtime_ns == src_mtime:
+                return thumb_path
+        except FileNotFoundError:
+            pass
+
+        # 向き情報を反映してから、印刷サイズに収まるよう縮小する(拡大はしない)
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((width_px, height_px), Image.LANCZOS)
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{thumb_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        if has_alpha:
+            img.convert("RGBA").save(tmp_path, format="PNG", optimize=True)
+        else:
+            img.convert("RGB").save(tmp_path, format="JPEG", quality=85, optimize=True)
+
+    os.replace(tmp_path, thumb_path)
+    os.utime(thumb_path, ns=(src_mtime, src_mtime))
+    return thumb_path
+
+
+def product_photo(index, keys, width_mm, height_mm, dpi=PHOTO_DPI, cache_dir=THUMB_CACHE_DIR):
+    """
+    商品の画像を探し、見つかれば縮小版のパスを返す。無ければNone。
+    壊れた・読めない画像はログに残して画像なし(None)として扱い、ジョブ全体は止めない。
+    """
+    src_path = find_product_image(index, keys)
+    if src_path is None:
+        return None
+    try:
+        return get_thumbnail(src_path, width_mm, height_mm, dpi, cache_dir)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        # UnidentifiedImageError も OSError のサブクラス
+        logger.warning("商品画像を読み込めないため画像なしで作成します: %s (%r)", src_path, e)
+        return None